@@ -0,0 +1,260 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import synthetic_scenes
+from grayscale import SUPPORTED_EXTENSIONS
+
+RESULT_FIELDS = ['image', 'plate', 'status', 'error', 'seconds', 'confidence', 'expected']
+
+# Recognizer owned by each worker process, created once by _init_worker
+_worker_recognizer = None
+
+# Scene generator of a worker recognizing synthetic:<index> images
+_worker_scenes = None
+
+
+def discover_images(source):
+    """Expand a directory, glob pattern, manifest file or single image into image paths"""
+    if os.path.isdir(source):
+        image_paths = []
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    image_paths.append(os.path.join(dirpath, filename))
+        return image_paths
+    if os.path.isfile(source):
+        if source.lower().endswith(SUPPORTED_EXTENSIONS):
+            return [source]
+        return read_manifest(source)
+    return sorted(path for path in glob.glob(source, recursive=True)
+                  if path.lower().endswith(SUPPORTED_EXTENSIONS))
+
+
+def read_manifest(manifest_path):
+    """Read one image path per line; relative paths are resolved against the manifest.
+
+    Lines may also be JSON objects with an 'image' key, as synthetic_scenes manifests are.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    image_paths = []
+    with open(manifest_path) as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                line = json.loads(line).get('image')
+                if line is None:
+                    continue
+            image_paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return image_paths
+
+
+def read_completed(output_path, output_format):
+    """Return the images already recorded in a previous (possibly crashed) run"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, newline='') as output:
+        if output_format == 'csv':
+            for row in csv.DictReader(output):
+                if row.get('image'):
+                    completed.add(row['image'])
+        else:
+            for line in output:
+                try:
+                    completed.add(json.loads(line)['image'])
+                except (ValueError, KeyError):
+                    # Last line of a crashed run may be truncated
+                    continue
+    return completed
+
+
+class ResultWriter:
+    """Append result records to a JSONL or CSV file, flushing each one"""
+
+    def __init__(self, output_path, output_format):
+        self.output_format = output_format
+        is_new = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        needs_newline = False
+        if not is_new:
+            with open(output_path, 'rb') as existing:
+                existing.seek(-1, os.SEEK_END)
+                needs_newline = existing.read(1) != b'\n'
+        self.file = open(output_path, 'a', newline='')
+        if needs_newline:
+            self.file.write('\n')
+        if output_format == 'csv':
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            if is_new:
+                self.csv_writer.writeheader()
+
+    def write(self, record):
+        if self.output_format == 'csv':
+            self.csv_writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def _init_worker(recognizer_options, cache_path=None, scene_options=None):
+    global _worker_recognizer, _worker_scenes
+    import prediction
+    import result_cache
+    cache = result_cache.ResultCache(disk_path=cache_path) if cache_path else None
+    _worker_recognizer = prediction.PlateRecognizer(cache=cache, **recognizer_options).warm_up()
+    if scene_options is not None:
+        _worker_scenes = synthetic_scenes.SceneGenerator(**scene_options)
+
+
+def _recognize_one(image_path):
+    start = time.perf_counter()
+    record = {'image': image_path, 'plate': None, 'status': 'ok', 'error': None, 'confidence': None,
+              'expected': None}
+    try:
+        scene_index = synthetic_scenes.synthetic_index(image_path)
+        if scene_index is not None:
+            # Rendered here rather than shipped from the parent, so frames never cross processes
+            image_path, truth = _worker_scenes.scene(scene_index)
+            record['expected'] = truth['text']
+        result = _worker_recognizer.recognize(image_path)
+        record['plate'] = result.text
+        record['status'] = result.status
+        record['confidence'] = round(result.confidence, 4) if result.confidence is not None else None
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def run_batch(image_paths, output_path, output_format='jsonl', workers=None, resume=True, progress=True,
+              recognizer_options=None, cache_path=None, scene_options=None, expected=None):
+    """Recognize images across a process pool, streaming records to output_path as they finish.
+
+    recognizer_options are keyword arguments for each worker's PlateRecognizer. With
+    cache_path set, workers share an on-disk result cache that survives between runs.
+    image_paths may be any sequence, such as synthetic_scenes.SyntheticImageNames;
+    workers render synthetic:<index> images with a SceneGenerator(**scene_options).
+    expected maps image paths to their known plates, as synthetic scenes carry theirs,
+    and is reported as accuracy.
+    """
+    completed = read_completed(output_path, output_format) if resume else set()
+    if not resume and os.path.exists(output_path):
+        os.remove(output_path)
+    skipped = len(completed.intersection(image_paths))
+    todo = (path for path in image_paths if path not in completed)
+    total = len(image_paths) - skipped
+    workers = workers or os.cpu_count() or 1
+    checked = correct = 0
+
+    writer = ResultWriter(output_path, output_format)
+    start = time.perf_counter()
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(recognizer_options or {}, cache_path, scene_options)) as executor:
+            remaining = iter(todo)
+            in_flight = set()
+            # Keep a bounded window of submitted work so huge batches don't queue every future up front
+            max_in_flight = workers * 4
+            while True:
+                for image_path in remaining:
+                    in_flight.add(executor.submit(_recognize_one, image_path))
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    if expected is not None and record['expected'] is None:
+                        record['expected'] = expected.get(record['image'])
+                    if record['expected'] is not None:
+                        checked += 1
+                        correct += record['plate'] == record['expected']
+                    writer.write(record)
+                    done += 1
+                if progress:
+                    elapsed = time.perf_counter() - start
+                    print(f"\r{done}/{total} images ({done / elapsed:.1f} img/s)", end='', file=sys.stderr)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    if progress:
+        print(f"\nProcessed {done} images in {elapsed:.1f}s with {workers} workers "
+              f"({skipped} skipped from a previous run)", file=sys.stderr)
+        if checked:
+            print(f"Read {correct}/{checked} known plates correctly ({correct / checked * 100:.1f}%)", file=sys.stderr)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recognize license plates for a batch of images")
+    parser.add_argument('source', nargs='?',
+                        help="image directory, glob pattern, manifest file or single image")
+    parser.add_argument('-o', '--output', required=True, help="results file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'],
+                        help="output format (default: from the output file extension)")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="overwrite the output instead of skipping images already done")
+    parser.add_argument('--engine', default='svc',
+                        help="classifier: 'svc', 'hamming' or a model file path (default: svc)")
+    parser.add_argument('--max-working-size', type=int, default=None,
+                        help="locate plates on a downscaled copy whose longest side fits this many pixels")
+    parser.add_argument('--pyramid-scale', type=float, default=0.5,
+                        help="downscale factor between pyramid levels (default: 0.5)")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="keep images 8-bit and let the JPEG decoder downscale towards --max-working-size")
+    parser.add_argument('--confidence-threshold', type=float, default=0.0,
+                        help="read the next plate candidate when a reading is less confident (default: 0)")
+    parser.add_argument('--max-candidates', type=int, default=3,
+                        help="plate candidates read per image at most (default: 3)")
+    parser.add_argument('--cache', default=None,
+                        help="sqlite file caching results by image content, reused across runs and output files")
+    parser.add_argument('--synthetic', type=int, default=None, metavar='COUNT',
+                        help="recognize COUNT generated scenes instead of a source, rendered on the fly")
+    parser.add_argument('--scene-seed', type=int, default=0, help="seed of the --synthetic scenes (default: 0)")
+    parser.add_argument('-q', '--quiet', action='store_true', help="don't report progress")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    scene_options = None
+    expected = None
+    if args.synthetic is not None:
+        image_paths = synthetic_scenes.SyntheticImageNames(args.synthetic)
+        scene_options = {'seed': args.scene_seed}
+    elif args.source is None:
+        parser.error("Give a source or --synthetic COUNT")
+    else:
+        image_paths = discover_images(args.source)
+        if not image_paths:
+            parser.error(f"No images found for {args.source}")
+        if os.path.basename(args.source) == synthetic_scenes.MANIFEST_NAME:
+            expected = synthetic_scenes.read_ground_truth(args.source)
+    run_batch(image_paths, args.output, output_format, workers=args.workers,
+              resume=not args.no_resume, progress=not args.quiet,
+              recognizer_options={'model_path': args.engine,
+                                  'max_working_size': args.max_working_size,
+                                  'pyramid_scale': args.pyramid_scale,
+                                  'low_memory': args.low_memory,
+                                  'confidence_threshold': args.confidence_threshold,
+                                  'max_candidates': args.max_candidates},
+              cache_path=args.cache, scene_options=scene_options, expected=expected)
+
+
+if __name__ == "__main__":
+    main()
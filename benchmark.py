@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+import cca
+import dataset
+import grayscale
+import prediction
+import segmentation
+import synthetic_scenes
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+
+# Sample scenes shipped with the repo and the plates they contain
+SAMPLE_PLATES = {
+    os.path.join(current_dir, 'car6.jpg'): 'LEM446AA',
+    os.path.join(current_dir, 'car10.jpg'): 'EGB62AA',
+}
+GLYPH_DIR = os.path.join(current_dir, 'train20X20')
+DEFAULT_SCALES = (0.5, 1.0, 2.0)
+DEFAULT_SYNTHETIC_RESOLUTIONS = ((480, 640), (720, 1280), (1080, 1920))
+
+# Run in a fresh interpreter so import and first-call costs are measured cold
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import prediction
+imported = time.perf_counter()
+recognizer = prediction.PlateRecognizer({engine!r})
+loaded = time.perf_counter()
+if {warm_up}:
+    recognizer.warm_up()
+warmed = time.perf_counter()
+recognizer.recognize({image_path!r})
+done = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'model_load': loaded - imported,
+                  'warm_up': warmed - loaded, 'first_image': done - warmed}}))
+"""
+
+# Metrics where a larger value is a regression, and where a smaller one is
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'peak_memory_mb')
+HIGHER_IS_BETTER = ('items_per_sec',)
+
+
+def measure(fn, repeat, warmup=1):
+    """Call fn repeatedly and return per-call wall times in seconds"""
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def peak_memory(fn):
+    """Peak traced allocation in bytes for a single call of fn"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(durations, items_per_call=1, peak_bytes=None):
+    durations_ms = np.array(durations) * 1000
+    summary = {
+        'calls': len(durations),
+        'p50_ms': float(np.percentile(durations_ms, 50)),
+        'p95_ms': float(np.percentile(durations_ms, 95)),
+        'p99_ms': float(np.percentile(durations_ms, 99)),
+        'items_per_sec': items_per_call * len(durations) / float(np.sum(durations)),
+    }
+    if peak_bytes is not None:
+        summary['peak_memory_mb'] = peak_bytes / 2**20
+    return summary
+
+
+def run_case(fn, repeat, items_per_call=1, track_memory=True):
+    peak_bytes = peak_memory(fn) if track_memory else None
+    return summarize(measure(fn, repeat), items_per_call, peak_bytes)
+
+
+def load_glyphs(glyph_dir=GLYPH_DIR):
+    """Binarized 400-d glyph vectors in the same layout the model was trained on, and their labels"""
+    image_data, target_data, glyph_shape = dataset.load_dataset(glyph_dir)
+    return image_data.astype(float), target_data
+
+
+def write_scaled_images(image_paths, scales, output_dir):
+    """Write every sample at every scale; returns {scale: [paths]}"""
+    scaled = {}
+    for scale in scales:
+        scaled[scale] = []
+        for image_path in image_paths:
+            img = Image.open(image_path).convert('RGB')
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            scaled_path = os.path.join(output_dir, f"{scale:g}x_{os.path.basename(image_path)}")
+            img.resize(size, Image.Resampling.LANCZOS).save(scaled_path, quality=95)
+            scaled[scale].append(scaled_path)
+    return scaled
+
+
+def cluttered_frame(shape=(1500, 2000), density=0.4, seed=0):
+    """Random binary noise with tens of thousands of components, like a busy street scene"""
+    binary = np.random.default_rng(seed).random(shape) < density
+    return binary * 255.0, binary
+
+
+def stage_benchmarks(image_path, repeat):
+    """Benchmark each pipeline stage in isolation on one sample image"""
+    results = {}
+    gray, binary = grayscale.process_image(image_path)
+    plate_like_objects, plate_objects_cordinates = cca.find_plate_candidates(gray, binary)
+    best_candidate, scores = segmentation.select_plate(plate_like_objects)
+    name = os.path.basename(image_path)
+
+    results[f'binarize[{name}]'] = run_case(lambda: grayscale.process_image(image_path), repeat)
+    results[f'cca[{name}]'] = run_case(lambda: cca.find_plate_candidates(gray, binary), repeat)
+    results[f'select_plate[{name}]'] = run_case(lambda: segmentation.select_plate(plate_like_objects), repeat)
+    characters = segmentation.extract_characters(best_candidate)[0]
+    results[f'extract_characters[{name}]'] = run_case(lambda: segmentation.extract_characters(best_candidate),
+                                                      repeat, items_per_call=len(characters))
+    return results
+
+
+def model_benchmarks(engine, glyphs, labels, repeat):
+    """Model load plus one-by-one and batched classification of the training glyphs"""
+    results = {}
+    recognizer = prediction.PlateRecognizer(engine)
+
+    def classify_one_by_one():
+        for glyph in glyphs:
+            recognizer.model.predict(glyph.reshape(1, -1))
+
+    results[f'classify_single[{engine}]'] = run_case(classify_one_by_one, max(1, repeat // 10),
+                                                     items_per_call=len(glyphs))
+    summary = run_case(lambda: recognizer.classify_characters(glyphs), repeat, items_per_call=len(glyphs))
+    summary['accuracy'] = float(np.mean(recognizer.classify_characters(glyphs) == labels))
+    results[f'classify_batched[{engine}]'] = summary
+    results[f'model_load[{engine}]'] = run_case(lambda: prediction.PlateRecognizer(engine), max(1, repeat // 10))
+    return results
+
+
+def pipeline_benchmarks(scaled_images, recognizer, repeat, name='pipeline'):
+    """End-to-end recognition at each resolution, with accuracy against the known plates"""
+    results = {}
+    for scale, image_paths in scaled_images.items():
+        expected = list(SAMPLE_PLATES.values())
+        plates = [recognizer.recognize(image_path).text for image_path in image_paths]
+
+        def run_all():
+            for image_path in image_paths:
+                recognizer.recognize(image_path)
+
+        summary = run_case(run_all, repeat, items_per_call=len(image_paths))
+        summary['accuracy'] = sum(p == e for p, e in zip(plates, expected)) / len(expected)
+        results[f'{name}[{scale:g}x]'] = summary
+    return results
+
+
+def synthetic_benchmarks(recognizer, count, resolutions, repeat, output_dir):
+    """End-to-end recognition of count generated scenes per resolution, with accuracy against their manifest"""
+    results = {}
+    for rows, cols in resolutions:
+        generator = synthetic_scenes.SceneGenerator((rows, cols))
+        manifest_path = synthetic_scenes.write_scenes(generator, os.path.join(output_dir, f"{rows}x{cols}"), count)
+        truth = synthetic_scenes.read_ground_truth(manifest_path)
+        plates = [recognizer.recognize(image_path).text for image_path in truth]
+
+        def run_all():
+            for image_path in truth:
+                recognizer.recognize(image_path)
+
+        summary = run_case(run_all, repeat, items_per_call=len(truth))
+        summary['accuracy'] = sum(p == e for p, e in zip(plates, truth.values())) / len(truth)
+        results[f'synthetic[{rows}x{cols}]'] = summary
+    return results
+
+
+def startup_timings(engine, warm_up):
+    script = STARTUP_SCRIPT.format(engine=engine, warm_up=warm_up, image_path=next(iter(SAMPLE_PLATES)))
+    output = subprocess.run([sys.executable, '-c', script], cwd=current_dir, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def startup_benchmarks(engine, runs):
+    """Cold-process import, model load and first-image latency, with and without warm_up()"""
+    cold = [startup_timings(engine, warm_up=False) for _ in range(runs)]
+    warm = [startup_timings(engine, warm_up=True) for _ in range(runs)]
+    return {
+        'startup_import': summarize([timings['import'] for timings in cold + warm]),
+        f'startup_model_load[{engine}]': summarize([timings['model_load'] for timings in cold + warm]),
+        'startup_first_image[cold]': summarize([timings['first_image'] for timings in cold]),
+        'startup_warm_up': summarize([timings['warm_up'] for timings in warm]),
+        'startup_first_image[warm]': summarize([timings['first_image'] for timings in warm]),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human-readable regressions of results against baseline"""
+    regressions = []
+    for name, metrics in results['benchmarks'].items():
+        base_metrics = baseline.get('benchmarks', {}).get(name)
+        if base_metrics is None:
+            continue
+        for key in LOWER_IS_BETTER:
+            if key in metrics and base_metrics.get(key) and metrics[key] > base_metrics[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {base_metrics[key]:.3f} -> {metrics[key]:.3f}")
+        for key in HIGHER_IS_BETTER:
+            if key in metrics and base_metrics.get(key) and metrics[key] < base_metrics[key] * (1 - tolerance):
+                regressions.append(f"{name}: {key} {base_metrics[key]:.3f} -> {metrics[key]:.3f}")
+        if metrics.get('accuracy', 1) < base_metrics.get('accuracy', 0):
+            regressions.append(f"{name}: accuracy {base_metrics['accuracy']:.2f} -> {metrics['accuracy']:.2f}")
+    return regressions
+
+
+def run_benchmarks(repeat=20, scales=DEFAULT_SCALES, stages=True, pipeline=True, recognizer_options=None,
+                   startup=True, synthetic_count=0, synthetic_resolutions=DEFAULT_SYNTHETIC_RESOLUTIONS):
+    recognizer_options = dict(recognizer_options or {})
+    recognizer_options.pop('low_memory', None)
+    recognizer = prediction.PlateRecognizer(**recognizer_options)
+    benchmarks = {}
+    if startup:
+        benchmarks.update(startup_benchmarks(recognizer_options.get('model_path', 'svc'), max(3, repeat // 4)))
+    if stages:
+        for image_path in SAMPLE_PLATES:
+            benchmarks.update(stage_benchmarks(image_path, repeat))
+        glyphs, labels = load_glyphs()
+        for engine in prediction.ENGINES:
+            benchmarks.update(model_benchmarks(engine, glyphs, labels, repeat))
+        gray, binary = cluttered_frame()
+        benchmarks['cca[cluttered]'] = run_case(lambda: cca.find_plate_candidates(gray, binary),
+                                                max(1, repeat // 4))
+    if pipeline:
+        with tempfile.TemporaryDirectory() as output_dir:
+            scaled_images = write_scaled_images(list(SAMPLE_PLATES), scales, output_dir)
+            benchmarks.update(pipeline_benchmarks(scaled_images, recognizer, repeat))
+            low_memory_recognizer = prediction.PlateRecognizer(low_memory=True, **recognizer_options)
+            benchmarks.update(pipeline_benchmarks(scaled_images, low_memory_recognizer, repeat, name='pipeline_uint8'))
+    if synthetic_count:
+        with tempfile.TemporaryDirectory() as output_dir:
+            benchmarks.update(synthetic_benchmarks(recognizer, synthetic_count, synthetic_resolutions,
+                                                   max(1, repeat // 4), output_dir))
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+        },
+        'benchmarks': benchmarks,
+    }
+
+
+def print_table(results):
+    print(f"{'benchmark':<34}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'items/s':>12}{'peak MB':>10}"
+          f"{'accuracy':>10}")
+    for name, metrics in results['benchmarks'].items():
+        accuracy = f"{metrics['accuracy']:.2f}" if 'accuracy' in metrics else '-'
+        print(f"{name:<34}{metrics['p50_ms']:>10.2f}{metrics['p95_ms']:>10.2f}{metrics['p99_ms']:>10.2f}"
+              f"{metrics['items_per_sec']:>12.1f}{metrics.get('peak_memory_mb', 0):>10.1f}{accuracy:>10}")
+
+    savings = memory_savings(results)
+    if savings:
+        print("\nPeak memory per image, float64 vs uint8 preprocessing:")
+        for scale, (float_mb, uint8_mb) in savings.items():
+            print(f"  {scale:<6}{float_mb:>8.1f} MB -> {uint8_mb:>6.1f} MB  ({float_mb / uint8_mb:.1f}x less)")
+
+
+def memory_savings(results):
+    """{scale: (float64 peak MB, uint8 peak MB)} for every resolution benchmarked in both modes"""
+    savings = {}
+    for name, metrics in results['benchmarks'].items():
+        if not name.startswith('pipeline['):
+            continue
+        low_memory = results['benchmarks'].get(name.replace('pipeline[', 'pipeline_uint8['))
+        if low_memory and metrics.get('peak_memory_mb') and low_memory.get('peak_memory_mb'):
+            savings[name[len('pipeline['):-1]] = (metrics['peak_memory_mb'], low_memory['peak_memory_mb'])
+    return savings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the license plate recognition pipeline")
+    parser.add_argument('-o', '--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare against a previous results file")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed relative slowdown before flagging a regression (default: 0.2)")
+    parser.add_argument('--repeat', type=int, default=20, help="timed calls per benchmark")
+    parser.add_argument('--scales', type=float, nargs='+', default=list(DEFAULT_SCALES),
+                        help="image resolutions for the end-to-end benchmark")
+    parser.add_argument('--engine', choices=sorted(prediction.ENGINES), default='svc',
+                        help="classifier used by the end-to-end benchmark (default: svc)")
+    parser.add_argument('--max-working-size', type=int, default=None,
+                        help="run the pipeline in multiscale localization mode with this working size")
+    parser.add_argument('--pyramid-scale', type=float, default=0.5,
+                        help="downscale factor between pyramid levels (default: 0.5)")
+    parser.add_argument('--synthetic', type=int, default=0, metavar='COUNT',
+                        help="also benchmark COUNT generated scenes per --synthetic-resolutions (default: 0)")
+    parser.add_argument('--synthetic-resolutions', type=synthetic_scenes.parse_resolution, nargs='+',
+                        default=list(DEFAULT_SYNTHETIC_RESOLUTIONS),
+                        help="ROWSxCOLS frame sizes of the synthetic scenes (default: 480x640 720x1280 1080x1920)")
+    parser.add_argument('--skip-stages', action='store_true', help="only run the end-to-end benchmark")
+    parser.add_argument('--skip-pipeline', action='store_true', help="only run the stage benchmarks")
+    parser.add_argument('--skip-startup', action='store_true',
+                        help="don't measure cold-start import and first-image latency in fresh processes")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.scales, stages=not args.skip_stages,
+                             pipeline=not args.skip_pipeline,
+                             recognizer_options={'model_path': args.engine,
+                                                 'max_working_size': args.max_working_size,
+                                                 'pyramid_scale': args.pyramid_scale},
+                             startup=not args.skip_startup, synthetic_count=args.synthetic,
+                             synthetic_resolutions=args.synthetic_resolutions)
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
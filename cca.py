@@ -1,32 +1,198 @@
 
 
-from skimage import measure
-from skimage.measure import regionprops
-import grayscale 
-
-def cca(image_path):
-
-    gray_car_image, binary_car_image = grayscale.process_image(image_path)
-    label_image = measure.label(binary_car_image)
-    plate_dimensions=(0.08*label_image.shape[0], 0.2*label_image.shape[0],
-                    0.15*label_image.shape[1], 0.4*label_image.shape[1])
-    min_height, max_height, min_width, max_width = plate_dimensions
-
-    plate_objects_cordinates = []
-    plate_like_objects = []
-
-    for region in regionprops(label_image):
-        if region.area < 50:
-            continue
-
-        minRow, minCol, maxRow, maxCol = region.bbox
-        region_height = maxRow - minRow
-        region_width = maxCol - minCol
-        if(region_height >= min_height and region_height <= max_height and
-        region_width >= min_width and region_width <= max_width):
-            plate_like_objects.append(gray_car_image[minRow:maxRow,
-                                                                minCol:maxCol])
-            plate_objects_cordinates.append((minRow, minCol, maxRow, maxCol))
+import math
 
-    return plate_like_objects, plate_objects_cordinates
+import numpy as np
+import grayscale
+import instrumentation
+
+# scipy.ndimage and skimage.transform are imported where they are used; they take
+# most of the import time and `import prediction` should stay cheap (see prediction.warm_up)
+
+# Components smaller than this many pixels are never plates
+MIN_PLATE_AREA = 50
+
+# Default factor between two levels of the localization pyramid
+PYRAMID_SCALE = 0.5
+
+# 8-connected labelling, like skimage.measure.label's default for 2-D images
+LABEL_STRUCTURE = np.ones((3, 3), dtype=bool)
+
+# Pixels per bincount call when measuring component areas, bounding its temporary copy
+AREA_CHUNK_PIXELS = 2**20
+
+def cca(image_path, debug=None, max_working_size=None, pyramid_scale=PYRAMID_SCALE, search_region=None,
+        accept=None):
+    """Find plate candidates in an image file or decoded frame.
+
+    With max_working_size set, candidates are located on a downscaled pyramid level
+    whose longest side fits max_working_size, and only their boxes are mapped back
+    to full resolution; the full-resolution frame is never thresholded or labelled.
+    Levels whose candidates accept(plate_like_objects) rejects are searched again one
+    level finer (see find_plate_candidates_multiscale). With search_region set, only
+    that (minRow, minCol, maxRow, maxCol) box is searched.
+    """
+    if search_region is not None:
+        if isinstance(image_path, np.ndarray):
+            # Only the region of a decoded frame is converted to gray
+            gray_region = grayscale.load_gray_region(image_path, search_region, debug=debug)
+            return find_plate_candidates_in_region(gray_region, search_region, image_path.shape[:2])
+        gray_car_image = grayscale.load_gray(image_path, debug=debug)
+        return find_plate_candidates_in_region(crop(gray_car_image, search_region), search_region,
+                                               gray_car_image.shape)
+    if max_working_size is None:
+        gray_car_image, binary_car_image = grayscale.process_image(image_path, debug=debug)
+        return find_plate_candidates(gray_car_image, binary_car_image)
+    gray_car_image = grayscale.load_gray(image_path, debug=debug)
+    return find_plate_candidates_multiscale(gray_car_image, max_working_size, pyramid_scale, accept)
+
+def cca_uint8(image_path, debug=None, max_working_size=None, pyramid_scale=PYRAMID_SCALE, search_region=None,
+              accept=None):
+    """Low-memory cca(): the image stays 8-bit grayscale and JPEGs are decoded near max_working_size.
+
+    Returns (plate_like_objects, plate_objects_cordinates, scale); boxes and crops are
+    in the decoded image, which is scale times the size of the stored one.
+    """
+    if search_region is not None and isinstance(image_path, np.ndarray):
+        gray_region = grayscale.load_gray_region(image_path, search_region, debug=debug, low_memory=True)
+        return find_plate_candidates_in_region(gray_region, search_region, image_path.shape[:2]) + (1.0,)
+    gray_car_image, scale = grayscale.load_gray_uint8(image_path, max_working_size, debug=debug)
+    if search_region is not None:
+        search_region = scale_box(search_region, scale)
+        return find_plate_candidates_in_region(crop(gray_car_image, search_region), search_region,
+                                               gray_car_image.shape) + (scale,)
+    if max_working_size is None:
+        return find_plate_candidates(gray_car_image, grayscale.binarize(gray_car_image)) + (scale,)
+    return find_plate_candidates_multiscale(gray_car_image, max_working_size, pyramid_scale, accept) + (scale,)
+
+def scale_box(box, scale):
+    """Scale a (minRow, minCol, maxRow, maxCol) box, growing it outwards to whole pixels"""
+    return (math.floor(box[0] * scale), math.floor(box[1] * scale),
+            math.ceil(box[2] * scale), math.ceil(box[3] * scale))
+
+def pyramid_levels(gray_car_image, max_working_size, pyramid_scale=PYRAMID_SCALE):
+    """Downscale by pyramid_scale until the longest side fits; returns [(level, overall scale)], finest first"""
+    if not 0 < pyramid_scale < 1:
+        raise ValueError("pyramid_scale must be between 0 and 1")
+    from skimage.transform import downscale_local_mean, rescale
+    level = gray_car_image
+    scale = 1.0
+    levels = [(level, scale)]
+    block = round(1 / pyramid_scale)
+    with instrumentation.stage('pyramid'):
+        while max(level.shape) > max_working_size:
+            scale *= pyramid_scale
+            if math.isclose(block, 1 / pyramid_scale):
+                # Integer factors reduce to a cheap block mean
+                rows = level.shape[0] - level.shape[0] % block
+                cols = level.shape[1] - level.shape[1] % block
+                level = downscale_local_mean(level[:rows, :cols], (block, block))
+            else:
+                level = rescale(level, pyramid_scale, anti_aliasing=True, preserve_range=True)
+            levels.append((level, scale))
+    return levels
+
+def pyramid_level(gray_car_image, max_working_size, pyramid_scale=PYRAMID_SCALE):
+    """The coarsest pyramid level whose longest side fits; returns (level, overall scale)"""
+    return pyramid_levels(gray_car_image, max_working_size, pyramid_scale)[-1]
 
+def find_plate_candidates_multiscale(gray_car_image, max_working_size, pyramid_scale=PYRAMID_SCALE, accept=None):
+    """Locate candidates on a pyramid level and crop them from the full-resolution gray image.
+
+    accept(plate_like_objects) says whether a level's candidates hold a plate; when
+    it says no, the next finer level is searched, down to the full-resolution image,
+    whose candidates are returned whatever accept says. At a coarse level a small
+    plate can merge with its surroundings into one component too big to be a plate.
+    """
+    levels = pyramid_levels(gray_car_image, max_working_size, pyramid_scale)
+    rows, cols = gray_car_image.shape
+    for level, scale in reversed(levels[1:]):
+        level_objects_cordinates = find_plate_candidates(level, grayscale.binarize(level))[1]
+        plate_objects_cordinates = []
+        plate_like_objects = []
+        # A level pixel covers 1/scale full-resolution pixels, so the coarse boundary can sit that far inside the plate
+        padding = math.ceil(1 / scale)
+        for minRow, minCol, maxRow, maxCol in level_objects_cordinates:
+            # Grow the box outwards so the coarse boundary never clips the plate
+            box = (max(0, math.floor(minRow / scale) - padding), max(0, math.floor(minCol / scale) - padding),
+                   min(rows, math.ceil(maxRow / scale) + padding), min(cols, math.ceil(maxCol / scale) + padding))
+            plate_objects_cordinates.append(box)
+            plate_like_objects.append(gray_car_image[box[0]:box[2], box[1]:box[3]])
+        if accept is None or accept(plate_like_objects):
+            return plate_like_objects, plate_objects_cordinates
+        instrumentation.count('pyramid_retries')
+
+    candidates = find_plate_candidates(gray_car_image, grayscale.binarize(gray_car_image))
+    if accept is not None:
+        accept(candidates[0])
+    return candidates
+
+def crop(gray_car_image, box):
+    return gray_car_image[box[0]:box[2], box[1]:box[3]]
+
+def find_plate_candidates_in_region(gray_region, search_region, frame_shape):
+    """Threshold and label the gray crop of search_region, keeping plate size limits relative to the whole frame.
+
+    Candidates touching an edge of the region that lies inside the frame are dropped:
+    they are plates cut off by the region, which read wrong, so the caller searches
+    the whole frame instead.
+    """
+    top, left = search_region[0], search_region[1]
+    rows, cols = gray_region.shape
+    plate_like_objects, region_objects_cordinates = find_plate_candidates(gray_region, grayscale.binarize(gray_region),
+                                                                          frame_shape=frame_shape)
+    whole = [(plate, box) for plate, box in zip(plate_like_objects, region_objects_cordinates)
+             if not ((top > 0 and box[0] == 0) or (left > 0 and box[1] == 0) or
+                     (top + rows < frame_shape[0] and box[2] == rows) or
+                     (left + cols < frame_shape[1] and box[3] == cols))]
+    plate_objects_cordinates = [(minRow + top, minCol + left, maxRow + top, maxCol + left)
+                                for plate, (minRow, minCol, maxRow, maxCol) in whole]
+    return [plate for plate, box in whole], plate_objects_cordinates
+
+def plate_dimensions(image_shape):
+    """(min_height, max_height, min_width, max_width) of a plate in an image of this shape"""
+    return (0.08*image_shape[0], 0.2*image_shape[0],
+            0.15*image_shape[1], 0.4*image_shape[1])
+
+def component_boxes(label_image, region_count):
+    """Areas and (minRow, minCol, maxRow, maxCol) boxes of labels 1..region_count as arrays"""
+    from scipy import ndimage
+    areas = np.zeros(region_count + 1, dtype=np.intp)
+    # bincount copies its input to intp; counting row bands keeps that copy small
+    rows_per_chunk = max(1, AREA_CHUNK_PIXELS // max(1, label_image.shape[1]))
+    for start in range(0, label_image.shape[0], rows_per_chunk):
+        areas += np.bincount(label_image[start:start + rows_per_chunk].ravel(), minlength=region_count + 1)
+    areas = areas[1:]
+    boxes = np.zeros((region_count, 4), dtype=np.intp)
+    for idx, (row_slice, col_slice) in enumerate(ndimage.find_objects(label_image, region_count)):
+        boxes[idx] = row_slice.start, col_slice.start, row_slice.stop, col_slice.stop
+    return areas, boxes
+
+def find_plate_candidates(gray_car_image, binary_car_image, frame_shape=None):
+    """Crop the gray image to every component whose box has plate-like dimensions.
+
+    Only areas and bounding boxes are computed for the labelled components,
+    and the size filter runs on all of them at once. Plate sizes are relative to
+    frame_shape, which defaults to the shape of the image itself.
+    """
+    from scipy import ndimage
+    with instrumentation.stage('label'):
+        # int32 labels take half the memory of skimage's int64 and number components identically
+        label_image, region_count = ndimage.label(binary_car_image, structure=LABEL_STRUCTURE, output=np.int32)
+    instrumentation.count('regions_labelled', region_count)
+    min_height, max_height, min_width, max_width = plate_dimensions(frame_shape or label_image.shape)
+
+    with instrumentation.stage('candidate_filter'):
+        areas, boxes = component_boxes(label_image, region_count)
+        region_height = boxes[:, 2] - boxes[:, 0]
+        region_width = boxes[:, 3] - boxes[:, 1]
+        keep = ((areas >= MIN_PLATE_AREA) &
+                (region_height >= min_height) & (region_height <= max_height) &
+                (region_width >= min_width) & (region_width <= max_width))
+
+        plate_objects_cordinates = [tuple(int(v) for v in box) for box in boxes[keep]]
+        plate_like_objects = [gray_car_image[minRow:maxRow, minCol:maxCol]
+                              for minRow, minCol, maxRow, maxCol in plate_objects_cordinates]
+    instrumentation.count('candidates_found', len(plate_like_objects))
+
+    return plate_like_objects, plate_objects_cordinates
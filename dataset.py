@@ -0,0 +1,101 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from skimage.io import imread
+from skimage.filters import threshold_otsu
+
+from grayscale import SUPPORTED_EXTENSIONS
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_DATASET_DIR = os.path.join(current_dir, 'train20X20')
+DEFAULT_CACHE_DIR = os.path.join(current_dir, '.cache', 'features')
+
+# Bump when the decoding below changes so existing feature stores are rebuilt
+FEATURE_VERSION = 1
+
+
+def discover_images(training_directory):
+    """Every image under training_directory/<label>/, as sorted (path, label) pairs"""
+    samples = []
+    for each_letter in sorted(os.listdir(training_directory)):
+        letter_dir = os.path.join(training_directory, each_letter)
+        if not os.path.isdir(letter_dir) or each_letter.startswith('.'):
+            continue
+        for filename in sorted(os.listdir(letter_dir)):
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                samples.append((os.path.join(letter_dir, filename), each_letter))
+    return samples
+
+
+def decode_glyph(image_path):
+    """Binarize a glyph image (dark character becomes True)"""
+    img_details = imread(image_path, as_gray=True)
+    return img_details < threshold_otsu(img_details)
+
+
+def dataset_signature(samples, training_directory):
+    """Hash of every source file's relative path, size and mtime"""
+    digest = hashlib.sha1(f"v{FEATURE_VERSION}".encode())
+    for image_path, each_letter in samples:
+        stat = os.stat(image_path)
+        rel_path = os.path.relpath(image_path, training_directory)
+        digest.update(f"{rel_path}\0{each_letter}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def feature_store_path(training_directory, cache_dir=DEFAULT_CACHE_DIR):
+    abs_dir = os.path.abspath(training_directory)
+    name = os.path.basename(abs_dir.rstrip(os.sep))
+    return os.path.join(cache_dir, f"{name}-{hashlib.sha1(abs_dir.encode()).hexdigest()[:12]}.npz")
+
+
+def decode_dataset(samples, workers=None):
+    """Decode glyphs in parallel; returns (bool features (N, h*w), labels, glyph shape)"""
+    image_paths = [image_path for image_path, each_letter in samples]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        glyphs = list(executor.map(decode_glyph, image_paths))
+    shapes = {glyph.shape for glyph in glyphs}
+    if len(shapes) > 1:
+        raise ValueError(f"Glyphs have mixed shapes: {sorted(shapes)}")
+    glyph_shape = shapes.pop() if shapes else (0, 0)
+    image_data = np.array([glyph.reshape(-1) for glyph in glyphs], dtype=bool).reshape(len(glyphs), -1)
+    target_data = np.array([each_letter for image_path, each_letter in samples])
+    return image_data, target_data, glyph_shape
+
+
+def load_dataset(training_directory=DEFAULT_DATASET_DIR, cache_dir=DEFAULT_CACHE_DIR, workers=None, refresh=False):
+    """Features, labels and glyph shape for a dataset, served from the feature store when current.
+
+    The store keeps bit-packed features and is rebuilt whenever a source image
+    is added, removed or modified.
+    """
+    samples = discover_images(training_directory)
+    signature = dataset_signature(samples, training_directory)
+    store_path = feature_store_path(training_directory, cache_dir)
+
+    if not refresh and os.path.exists(store_path):
+        with np.load(store_path) as store:
+            if str(store['signature']) == signature:
+                glyph_shape = tuple(int(v) for v in store['glyph_shape'])
+                n_features = glyph_shape[0] * glyph_shape[1]
+                image_data = np.unpackbits(store['packed'], axis=1, count=n_features).astype(bool)
+                return image_data, store['labels'], glyph_shape
+
+    image_data, target_data, glyph_shape = decode_dataset(samples, workers)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write then rename so a crashed run never leaves a half-written store. Every writer gets
+    # its own temp file, so processes building the same store at once just replace each other's
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(store_path), suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            np.savez(tmp_file, packed=np.packbits(image_data, axis=1), labels=target_data,
+                     glyph_shape=np.array(glyph_shape), signature=np.array(signature))
+        os.replace(tmp_path, store_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return image_data, target_data, glyph_shape
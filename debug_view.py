@@ -0,0 +1,86 @@
+import matplotlib.patches as patches
+import matplotlib.pyplot as plt
+
+
+class DebugVisualizer:
+    """Opt-in debug hook that prints every pipeline step and plots the segmented plate.
+
+    Pass an instance as ``debug=`` to the pipeline functions or to PlateRecognizer.
+    """
+
+    def __init__(self, show_plots=True):
+        self.show_plots = show_plots
+
+    def image_loaded(self, shape):
+        print(shape)
+
+    def candidates_analyzed(self, count):
+        print(f"\nAnalyzing {count} plate-like objects:")
+
+    def candidate_pruned(self, idx, h, w, aspect_ratio):
+        print(f"\n  Object {idx}: h={h}, w={w}, aspect_ratio={aspect_ratio:.2f}")
+        print("    ✗ Rejected by shape before thresholding")
+
+    def candidate_scored(self, idx, h, w, aspect_ratio, region_count, char_count, score):
+        print(f"\n  Object {idx}: h={h}, w={w}, aspect_ratio={aspect_ratio:.2f}, regions={region_count}")
+        if 2.0 <= aspect_ratio <= 5.0:
+            print(f"    ✓ Good aspect ratio: {aspect_ratio:.2f}")
+        else:
+            print(f"    ✗ Bad aspect ratio: {aspect_ratio:.2f} (expected 2-5)")
+        if 4 <= region_count <= 10:
+            print(f"    ✓ Good region count: {region_count}")
+        else:
+            print(f"    ✗ Bad region count: {region_count} (expected 4-10)")
+        if char_count >= 4:
+            print(f"    ✓ Character-like regions: {char_count}")
+        else:
+            print(f"    ✗ Few character-like regions: {char_count} (expected 4+)")
+        print(f"    Score: {score}")
+
+    def plate_selected(self, score):
+        print(f"\n✓ Selected object with score {score}")
+
+    def character_regions(self, license_plate, character_dimensions, accepted, rejected):
+        min_height, max_height, min_width, max_width = character_dimensions
+        print("Character dimension thresholds:")
+        print(f"  Height: {min_height:.2f} < h < {max_height:.2f}")
+        print(f"  Width: {min_width:.2f} < w < {max_width:.2f}")
+        print("Number of regions detected:", len(accepted) + len(rejected))
+        for y0, x0, y1, x1 in accepted:
+            print(f"Region: height={y1 - y0:.2f}, width={x1 - x0:.2f}\n  ✓ Accepted")
+        for y0, x0, y1, x1 in rejected:
+            print(f"Region: height={y1 - y0:.2f}, width={x1 - x0:.2f}\n  ✗ Rejected")
+
+        if not self.show_plots:
+            return
+        fig, ax1 = plt.subplots(1, figsize=(12, 4))
+        ax1.imshow(license_plate, cmap="gray")
+        ax1.set_title("Detected Character Regions")
+        for y0, x0, y1, x1 in accepted:
+            # Draw accepted rectangle in GREEN
+            ax1.add_patch(patches.Rectangle((x0, y0), x1 - x0, y1 - y0, edgecolor="green",
+                                            linewidth=2, fill=False))
+        for y0, x0, y1, x1 in rejected:
+            # Draw rejected rectangle in RED
+            ax1.add_patch(patches.Rectangle((x0, y0), x1 - x0, y1 - y0, edgecolor="red",
+                                            linewidth=2, fill=False, linestyle="--"))
+
+    def characters_extracted(self, characters, column_list):
+        print("Characters extracted:", len(characters))
+        print("Column list:", column_list)
+        if not self.show_plots:
+            return
+        if len(characters) > 0:
+            fig_chars, axes = plt.subplots(1, len(characters), figsize=(3*len(characters), 3))
+            if len(characters) == 1:
+                axes = [axes]
+            for idx, char in enumerate(characters):
+                axes[idx].imshow(char, cmap="gray")
+                axes[idx].set_title(f"Char {idx}\nCol: {column_list[idx]}")
+                axes[idx].axis('off')
+            plt.tight_layout()
+        plt.show()
+
+    def plate_recognized(self, predictions, plate_string):
+        print(f"\nAll predictions: {list(predictions)}")
+        print(f"Plate string (sorted): {plate_string}")
@@ -0,0 +1,331 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Slot states
+FREE, WRITING, READY, READING = range(4)
+
+# What put() does when every slot is taken
+POLICIES = ('block', 'drop_oldest')
+
+# Shared counters, in the order they are stored in the ring header
+COUNTER_NAMES = ('frames_written', 'frames_dropped', 'frames_read', 'frames_released', 'producer_wait_ns',
+                 'started_ns', 'closed')
+
+DEFAULT_SLOTS = 16
+DEFAULT_MAX_SHAPE = (1080, 1920, 3)
+
+
+def _attach(name):
+    """Attach to an existing shared memory block that the ring's creator will unlink"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block again, but worker processes share
+        # their parent's resource tracker, so the creator's unlink still unregisters it once
+        return shared_memory.SharedMemory(name)
+
+
+class FrameRing:
+    """Fixed-size uint8 frame slots in shared memory, handed from producers to consumer processes.
+
+    A producer writes each decoded frame once into a free slot (put, or reserve and
+    commit to decode straight into it); a consumer gets a read-only view of the
+    oldest ready frame without copying it and releases the slot when done. When
+    every slot is taken, put() waits with policy 'block' or reclaims the oldest frame
+    nobody has started reading with 'drop_oldest'. The ring pickles by shared memory
+    name, so it can be passed to worker processes when they start.
+    """
+
+    def __init__(self, slots=DEFAULT_SLOTS, max_shape=DEFAULT_MAX_SHAPE, policy='block', context=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}; choose one of {', '.join(POLICIES)}")
+        context = context or multiprocessing.get_context()
+        self.slots = slots
+        self.max_shape = tuple(max_shape) + (1,) * (3 - len(max_shape))
+        self.policy = policy
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self.frames = shared_memory.SharedMemory(create=True, size=slots * self.slot_bytes)
+        self.header = shared_memory.SharedMemory(create=True, size=self._header_size(slots))
+        # Forked workers inherit this object as is, so ownership goes by process
+        self.owner_pid = os.getpid()
+        self.lock = context.Lock()
+        self.frame_ready = context.Condition(self.lock)
+        self.slot_freed = context.Condition(self.lock)
+        self._map()
+        self.counters[:] = 0
+        self.state[:] = FREE
+
+    @staticmethod
+    def _header_size(slots):
+        # counters, then per slot: sequence number, frame index, state and a 3-d shape
+        return 8 * (len(COUNTER_NAMES) + slots * 6)
+
+    def _map(self):
+        header = np.ndarray(self._header_size(self.slots) // 8, dtype=np.int64, buffer=self.header.buf)
+        self.counters = header[:len(COUNTER_NAMES)]
+        per_slot = header[len(COUNTER_NAMES):].reshape(self.slots, 6)
+        self.sequence, self.frame_index, self.state, self.shape = (per_slot[:, 0], per_slot[:, 1], per_slot[:, 2],
+                                                                   per_slot[:, 3:])
+        self.slot_arrays = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=self.frames.buf)
+
+    def __getstate__(self):
+        return {'slots': self.slots, 'max_shape': self.max_shape, 'policy': self.policy,
+                'frames': self.frames.name, 'header': self.header.name,
+                'lock': self.lock, 'frame_ready': self.frame_ready, 'slot_freed': self.slot_freed}
+
+    def __setstate__(self, state):
+        self.slots, self.max_shape, self.policy = state['slots'], state['max_shape'], state['policy']
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self.frames, self.header = _attach(state['frames']), _attach(state['header'])
+        self.owner_pid = None
+        self.lock, self.frame_ready, self.slot_freed = state['lock'], state['frame_ready'], state['slot_freed']
+        self._map()
+
+    def _count(self, name, value=1):
+        self.counters[COUNTER_NAMES.index(name)] += value
+
+    def reserve(self, timeout=None):
+        """Claim a slot for writing; returns its index, or None if none came free within timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            waited = time.monotonic_ns()
+            while True:
+                free = np.flatnonzero(self.state == FREE)
+                if len(free):
+                    slot = int(free[0])
+                    break
+                ready = np.flatnonzero(self.state == READY)
+                if self.policy == 'drop_oldest' and len(ready):
+                    slot = int(ready[self.sequence[ready].argmin()])
+                    self._count('frames_dropped')
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._count('producer_wait_ns', time.monotonic_ns() - waited)
+                    return None
+                self.slot_freed.wait(remaining)
+            self._count('producer_wait_ns', time.monotonic_ns() - waited)
+            self.state[slot] = WRITING
+        return slot
+
+    def slot_view(self, slot, shape):
+        """Writable array of the given frame shape over a reserved slot"""
+        return self.slot_arrays[slot, :int(np.prod(shape))].reshape(shape)
+
+    def commit(self, slot, shape, frame_index=-1):
+        """Publish the frame written into a reserved slot"""
+        with self.lock:
+            self.shape[slot] = tuple(shape) + (0,) * (3 - len(shape))
+            self.frame_index[slot] = frame_index
+            self.sequence[slot] = self.counters[COUNTER_NAMES.index('frames_written')]
+            self.state[slot] = READY
+            if not self.counters[COUNTER_NAMES.index('frames_written')]:
+                self.counters[COUNTER_NAMES.index('started_ns')] = time.monotonic_ns()
+            self._count('frames_written')
+            self.frame_ready.notify()
+
+    def put(self, frame, frame_index=-1, timeout=None):
+        """Copy a decoded uint8 frame into the ring; returns False if no slot came free within timeout"""
+        frame = np.asarray(frame)
+        if frame.dtype != np.uint8:
+            raise ValueError(f"Frames must be uint8, not {frame.dtype}")
+        if frame.ndim not in (2, 3) or frame.size > self.slot_bytes:
+            raise ValueError(f"Frame of shape {frame.shape} does not fit slots of shape {self.max_shape}")
+        slot = self.reserve(timeout)
+        if slot is None:
+            return False
+        self.slot_view(slot, frame.shape)[...] = frame
+        self.commit(slot, frame.shape, frame_index)
+        return True
+
+    def get(self, timeout=None):
+        """Oldest ready frame as (slot, frame_index, read-only view), or None once closed and drained or on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            while True:
+                ready = np.flatnonzero(self.state == READY)
+                if len(ready):
+                    slot = int(ready[self.sequence[ready].argmin()])
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if self.counters[COUNTER_NAMES.index('closed')] or (remaining is not None and remaining <= 0):
+                    return None
+                self.frame_ready.wait(remaining)
+            self.state[slot] = READING
+            self._count('frames_read')
+            shape = tuple(int(size) for size in self.shape[slot] if size)
+            frame_index = int(self.frame_index[slot])
+        frame = self.slot_view(slot, shape)
+        frame.flags.writeable = False
+        return slot, frame_index, frame
+
+    def release(self, slot):
+        """Return a slot obtained from get() for reuse"""
+        with self.lock:
+            self.state[slot] = FREE
+            self._count('frames_released')
+            self.slot_freed.notify()
+
+    def close(self):
+        """Tell consumers that no more frames will come; they drain what is ready and stop"""
+        with self.lock:
+            self.counters[COUNTER_NAMES.index('closed')] = 1
+            self.frame_ready.notify_all()
+
+    def stats(self):
+        """Counters plus frames per second written and released since the first frame was written"""
+        with self.lock:
+            counters = {name: int(value) for name, value in zip(COUNTER_NAMES, self.counters)}
+            in_use = int(np.count_nonzero(self.state != FREE))
+        started = counters.pop('started_ns')
+        elapsed = (time.monotonic_ns() - started) / 1e9 if started else 0.0
+        counters.pop('closed')
+        counters['producer_wait_seconds'] = counters.pop('producer_wait_ns') / 1e9
+        counters['slots_in_use'] = in_use
+        counters['written_per_sec'] = counters['frames_written'] / elapsed if elapsed else 0.0
+        counters['released_per_sec'] = counters['frames_released'] / elapsed if elapsed else 0.0
+        return counters
+
+    def detach(self):
+        """Close this process's mapping; the creator also frees the shared memory"""
+        # Views into the buffers must go before the mappings can close
+        self.counters = self.sequence = self.frame_index = self.state = self.shape = self.slot_arrays = None
+        self.frames.close()
+        self.header.close()
+        if self.owner_pid == os.getpid():
+            self.frames.unlink()
+            self.header.unlink()
+
+
+def _ring_worker(ring, recognizer_options, results):
+    """Recognize frames from the ring until it is closed, sending back small result records"""
+    import prediction
+    recognizer = prediction.PlateRecognizer(**recognizer_options).warm_up()
+    try:
+        while True:
+            item = ring.get()
+            if item is None:
+                break
+            slot, frame_index, frame = item
+            start = time.perf_counter()
+            record = {'frame': frame_index, 'plate': None, 'status': 'ok', 'confidence': None, 'error': None}
+            try:
+                result = recognizer.recognize(frame)
+                record.update(plate=result.text, status=result.status, confidence=result.confidence)
+            except Exception as e:
+                record.update(status='error', error=f"{type(e).__name__}: {e}")
+            finally:
+                del frame
+                ring.release(slot)
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            results.put(record)
+    finally:
+        ring.detach()
+
+
+class RingRecognizer:
+    """Pool of recognizer processes reading frames zero-copy from a FrameRing.
+
+    submit() writes a frame into the ring once; records come back on the results
+    queue as {'frame', 'plate', 'status', 'confidence', 'error', 'seconds'} dicts.
+    """
+
+    def __init__(self, workers=None, slots=DEFAULT_SLOTS, max_shape=DEFAULT_MAX_SHAPE, policy='block',
+                 recognizer_options=None):
+        context = multiprocessing.get_context()
+        self.ring = FrameRing(slots, max_shape, policy, context)
+        self.results = context.Queue()
+        self.processes = [context.Process(target=_ring_worker, args=(self.ring, recognizer_options or {},
+                                                                      self.results), daemon=True)
+                          for _ in range(workers or os.cpu_count() or 1)]
+        for process in self.processes:
+            process.start()
+
+    def submit(self, frame, frame_index=-1, timeout=None):
+        return self.ring.put(frame, frame_index, timeout)
+
+    def drain(self):
+        """Records finished so far, without waiting"""
+        records = []
+        while True:
+            try:
+                records.append(self.results.get_nowait())
+            except queue.Empty:
+                return records
+
+    def finish(self):
+        """Close the ring, wait for the workers to drain it and return the remaining records"""
+        self.ring.close()
+        records = []
+        while any(process.is_alive() for process in self.processes) or not self.results.empty():
+            try:
+                records.append(self.results.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        for process in self.processes:
+            process.join()
+        return records
+
+    def close(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        self.ring.detach()
+
+
+def main(argv=None):
+    import stream
+    parser = argparse.ArgumentParser(description="Recognize plates in frames handed to worker processes "
+                                                 "through a shared-memory ring buffer")
+    parser.add_argument('source', help="video file or directory of sequential frame images")
+    parser.add_argument('-o', '--output', help="write one JSON line per frame to this file")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="recognizer processes (default: CPU count)")
+    parser.add_argument('--slots', type=int, default=DEFAULT_SLOTS, help="frame slots in the ring (default: 16)")
+    parser.add_argument('--max-shape', type=int, nargs='+', default=list(DEFAULT_MAX_SHAPE),
+                        help="largest frame shape a slot holds (default: 1080 1920 3)")
+    parser.add_argument('--policy', choices=POLICIES, default='block',
+                        help="when every slot is taken, wait or drop the oldest unread frame (default: block)")
+    parser.add_argument('--step', type=int, default=1, help="only process every n-th frame (default: 1)")
+    parser.add_argument('--engine', default='svc',
+                        help="classifier: 'svc', 'hamming' or a model file path (default: svc)")
+    parser.add_argument('--max-working-size', type=int, default=None,
+                        help="locate plates on a downscaled copy whose longest side fits this many pixels")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="keep frames 8-bit, so gray frames are processed in place in the ring")
+    args = parser.parse_args(argv)
+
+    recognizer_options = {'model_path': args.engine, 'max_working_size': args.max_working_size,
+                          'low_memory': args.low_memory}
+    pool = RingRecognizer(args.workers, args.slots, args.max_shape, args.policy, recognizer_options)
+    output_file = open(args.output, 'w') if args.output else None
+    records = []
+    try:
+        for frame_index, frame in stream.iter_frames(args.source, args.step):
+            pool.submit(np.asarray(frame, dtype=np.uint8), frame_index)
+            records.extend(pool.drain())
+        records.extend(pool.finish())
+        stats = pool.ring.stats()
+    finally:
+        pool.close()
+
+    for record in sorted(records, key=lambda record: record['frame']):
+        if output_file is not None:
+            output_file.write(json.dumps(record) + '\n')
+        print(f"frame {record['frame']}: {record['plate'] or record['status']}")
+    if output_file is not None:
+        output_file.close()
+    print(f"{stats['frames_written']} frames written, {stats['frames_dropped']} dropped, "
+          f"{stats['frames_released']} recognized ({stats['released_per_sec']:.1f} frames/s), "
+          f"producer waited {stats['producer_wait_seconds']:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
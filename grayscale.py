@@ -1,18 +1,133 @@
-from skimage.io import imread
-from skimage.filters import threshold_otsu
+import math
+
+import numpy as np
+import instrumentation
+
+# Pillow and skimage are imported where they are used so that importing the
+# pipeline stays cheap (see prediction.warm_up)
 
 
 SUPPORTED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif')
 
-def process_image(image_path):
+# skimage.color.rgb2gray's luma weights, so both decoding paths see the same gray levels
+LUMA_MATRIX = (0.2125, 0.7154, 0.0721, 0)
+
+def gray_from_array(frame):
+    """Convert a decoded gray, RGB or RGBA frame (integer, or float in 0-1) to float gray in 0-255"""
+    from skimage.color import rgb2gray, rgba2rgb
+    from skimage.util import img_as_float
+    frame = np.asarray(frame)
+    if frame.ndim == 3 and frame.shape[2] == 4:
+        frame = rgba2rgb(frame)
+    if frame.ndim == 3:
+        return rgb2gray(frame) * 255
+    return img_as_float(frame) * 255
+
+def load_gray(image_path, debug=None):
+    """Read an image file, or convert an already decoded frame, to a float grayscale array in the 0-255 range"""
+    if isinstance(image_path, np.ndarray):
+        with instrumentation.stage('to_gray'):
+            gray_car_image = gray_from_array(image_path)
+        if debug is not None:
+            debug.image_loaded(gray_car_image.shape)
+        return gray_car_image
+
     if not image_path.lower().endswith(SUPPORTED_EXTENSIONS):
-        print(f"Unsupported file type. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}")
-        return
+        raise ValueError(f"Unsupported file type. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}")
     
-    car_image = imread(image_path, as_gray=True)
-    print(car_image.shape)
+    from skimage.io import imread
+    from skimage.util import img_as_float
+    with instrumentation.stage('imread'):
+        # as_gray leaves single-channel files in their stored dtype, so scale those to 0-1 too
+        car_image = img_as_float(imread(image_path, as_gray=True))
+        gray_car_image = car_image * 255
+    if debug is not None:
+        debug.image_loaded(car_image.shape)
+    return gray_car_image
+
+def load_gray_uint8(image_path, max_working_size=None, debug=None):
+    """Decode straight to 8-bit grayscale; returns (gray, scale of gray relative to the stored image).
+
+    When max_working_size is below a JPEG's native size, the decoder itself
+    downscales it (by 1/2, 1/4 or 1/8) to the smallest size whose longest side
+    still reaches max_working_size.
+    """
+    if isinstance(image_path, np.ndarray):
+        with instrumentation.stage('to_gray'):
+            gray_car_image = gray_array_uint8(image_path)
+        if debug is not None:
+            debug.image_loaded(gray_car_image.shape)
+        return gray_car_image, 1.0
+
+    if not image_path.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise ValueError(f"Unsupported file type. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+    from PIL import Image
+    with instrumentation.stage('imread'):
+        with Image.open(image_path) as img:
+            width, height = img.size
+            if max_working_size is not None and max(width, height) > max_working_size:
+                ratio = max_working_size / max(width, height)
+                img.draft('RGB', (math.ceil(width * ratio), math.ceil(height * ratio)))
+            gray_car_image = np.asarray(pil_to_gray(img))
+    if debug is not None:
+        debug.image_loaded(gray_car_image.shape)
+    return gray_car_image, gray_car_image.shape[1] / width
+
+def load_gray_region(frame, search_region, debug=None, low_memory=False):
+    """Grayscale crop of a decoded frame to a (minRow, minCol, maxRow, maxCol) box, converting only the box"""
+    top, left, bottom, right = search_region
+    frame = np.asarray(frame)
+    with instrumentation.stage('to_gray'):
+        region = frame[top:bottom, left:right]
+        gray_region = gray_array_uint8(region) if low_memory else gray_from_array(region)
+    if debug is not None:
+        debug.image_loaded(frame.shape[:2])
+    return gray_region
+
+def pil_to_gray(img):
+    if img.mode == 'L':
+        return img
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img.convert('L', matrix=LUMA_MATRIX)
+
+def gray_array_uint8(frame):
+    """8-bit grayscale copy of a decoded frame, converting uint8 colour frames without floats"""
+    from PIL import Image
+    frame = np.asarray(frame)
+    if frame.dtype == np.uint8 and frame.ndim == 2:
+        return frame
+    if frame.dtype == np.uint8 and frame.ndim == 3 and frame.shape[2] in (3, 4):
+        return np.asarray(pil_to_gray(Image.fromarray(frame)))
+    return np.round(gray_from_array(frame)).astype(np.uint8)
+
+def threshold_otsu_uint8(gray_car_image, rows_per_chunk=256):
+    """Otsu threshold of an 8-bit image from a histogram counted in row bands.
+
+    Matches threshold_otsu(gray_car_image), which would first copy the whole
+    frame to a wider integer type.
+    """
+    from skimage.filters import threshold_otsu
+    counts = np.zeros(256, dtype=np.intp)
+    for start in range(0, gray_car_image.shape[0], rows_per_chunk):
+        counts += np.bincount(gray_car_image[start:start + rows_per_chunk].ravel(), minlength=256)
+    occupied = np.flatnonzero(counts)
+    low, high = occupied[0], occupied[-1] + 1
+    if high - low == 1:
+        return low
+    return threshold_otsu(hist=(counts[low:high], np.arange(low, high)))
+
+def binarize(gray_car_image):
+    from skimage.filters import threshold_otsu
+    with instrumentation.stage('threshold'):
+        if gray_car_image.dtype == np.uint8:
+            threshold_value = threshold_otsu_uint8(gray_car_image)
+        else:
+            threshold_value = threshold_otsu(gray_car_image)
+        binary_car_image = gray_car_image > threshold_value
+    return binary_car_image
 
-    gray_car_image = car_image * 255
-    threshold_value = threshold_otsu(gray_car_image)
-    binary_car_image = gray_car_image > threshold_value
-    return gray_car_image, binary_car_image
\ No newline at end of file
+def process_image(image_path, debug=None):
+    gray_car_image = load_gray(image_path, debug=debug)
+    return gray_car_image, binarize(gray_car_image)
\ No newline at end of file
@@ -1,17 +1,29 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 from PIL import Image, ImageTk
 import os
-import prediction
-import threading
-import matplotlib
-matplotlib.use('TkAgg')  # Use TkAgg backend to work with tkinter
+import queue
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+import batch_recognize
+import result_cache
+
+PREVIEW_SIZE = (480, 220)
+
+
+def load_preview(image_path):
+    """Decode an image scaled to fit the preview; runs on a background thread"""
+    with Image.open(image_path) as image:
+        # JPEGs can be decoded directly at a fraction of their size
+        image.draft('RGB', PREVIEW_SIZE)
+        img = image.convert('RGB')
+    img.thumbnail(PREVIEW_SIZE, Image.Resampling.LANCZOS)
+    return img
 
 class LicensePlateGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("License Plate Recognition")
-        self.root.geometry("600x700")
+        self.root.geometry("640x900")
         self.root.configure(bg="#f0f0f0")
         self.root.resizable(False, False)
         
@@ -21,11 +33,30 @@ class LicensePlateGUI:
         self.accent_color = "#3498db"
         self.success_color = "#27ae60"
         
-        # Selected image path
-        self.selected_image_path = None
+        # Selected images, in the order they will be recognized
+        self.selected_image_paths = []
         self.is_processing = False
         
+        # Recognition runs on a pool of worker processes that lives as long as the window;
+        # finished futures come back through result_queue, tagged 'result' or 'preview', and are
+        # drained on the Tk thread
+        self.worker_count = os.cpu_count() or 1
+        self.pool = None
+        self.result_queue = queue.Queue()
+        self.pending_paths = iter(())
+        # Submitted futures not yet drained, with the image each one recognizes
+        self.submitted = {}
+        self.completed = 0
+        self.cancelled = False
+        self.polling = False
+        
+        # Previews are decoded off the Tk thread; only the newest request is shown
+        self.preview_executor = ThreadPoolExecutor(max_workers=1)
+        self.preview_token = 0
+        self.previews_pending = 0
+        
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
     
     def setup_ui(self):
         """Setup the user interface"""
@@ -63,7 +94,7 @@ class LicensePlateGUI:
             border=2,
             relief=tk.SUNKEN,
             width=500,
-            height=250
+            height=220
         )
         self.preview_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
         self.preview_frame.pack_propagate(False)
@@ -81,10 +112,10 @@ class LicensePlateGUI:
         button_frame = tk.Frame(content_frame, bg=self.bg_color)
         button_frame.pack(fill=tk.X, pady=10)
         
-        # Select image button
+        # Select image button (several files can be selected at once)
         self.select_btn = tk.Button(
             button_frame,
-            text="📁 Select Image",
+            text="📁 Select Images",
             command=self.select_image,
             font=("Helvetica", 11, "bold"),
             bg=self.accent_color,
@@ -97,6 +128,22 @@ class LicensePlateGUI:
         )
         self.select_btn.pack(side=tk.LEFT, padx=5)
         
+        # Select folder button
+        self.folder_btn = tk.Button(
+            button_frame,
+            text="🗂 Folder",
+            command=self.select_folder,
+            font=("Helvetica", 11, "bold"),
+            bg=self.accent_color,
+            fg="white",
+            padx=12,
+            pady=10,
+            border=0,
+            cursor="hand2",
+            relief=tk.RAISED
+        )
+        self.folder_btn.pack(side=tk.LEFT, padx=5)
+        
         # Predict button
         self.predict_btn = tk.Button(
             button_frame,
@@ -114,6 +161,27 @@ class LicensePlateGUI:
         )
         self.predict_btn.pack(side=tk.LEFT, padx=5)
         
+        # Cancel button
+        self.cancel_btn = tk.Button(
+            button_frame,
+            text="✖ Cancel",
+            command=self.cancel_batch,
+            font=("Helvetica", 11, "bold"),
+            bg="#e74c3c",
+            fg="white",
+            padx=12,
+            pady=10,
+            border=0,
+            cursor="hand2",
+            relief=tk.RAISED,
+            state=tk.DISABLED
+        )
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Progress bar
+        self.progress = ttk.Progressbar(content_frame, orient=tk.HORIZONTAL, mode='determinate')
+        self.progress.pack(fill=tk.X, pady=(0, 5))
+        
         # Result section
         result_label = tk.Label(
             content_frame,
@@ -138,10 +206,31 @@ class LicensePlateGUI:
             font=("Helvetica", 28, "bold"),
             bg="white",
             fg=self.primary_color,
-            pady=30
+            pady=15
         )
         self.result_text.pack(expand=True)
         
+        # Results table
+        table_frame = tk.Frame(content_frame, bg=self.bg_color)
+        table_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 5))
+        
+        self.results_table = ttk.Treeview(
+            table_frame,
+            columns=("image", "plate", "confidence", "status", "seconds"),
+            show="headings",
+            height=8
+        )
+        for column, heading, width in (("image", "Image", 220), ("plate", "Plate", 100),
+                                       ("confidence", "Confidence", 80), ("status", "Status", 110),
+                                       ("seconds", "Time (s)", 70)):
+            self.results_table.heading(column, text=heading)
+            self.results_table.column(column, width=width, anchor=tk.W)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.results_table.yview)
+        self.results_table.configure(yscrollcommand=scrollbar.set)
+        self.results_table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.results_table.bind("<<TreeviewSelect>>", self.on_result_selected)
+        
         # Status frame
         status_frame = tk.Frame(content_frame, bg=self.bg_color)
         status_frame.pack(fill=tk.X, pady=10)
@@ -166,9 +255,9 @@ class LicensePlateGUI:
         self.file_info_label.pack(anchor=tk.W, pady=(5, 0))
     
     def select_image(self):
-        """Open file dialog to select an image"""
-        file_path = filedialog.askopenfilename(
-            title="Select License Plate Image",
+        """Open file dialog to select one or more images"""
+        file_paths = filedialog.askopenfilenames(
+            title="Select License Plate Images",
             filetypes=[
                 ("Image Files", "*.jpg *.jpeg *.png *.bmp *.tiff *.tif"),
                 ("JPEG", "*.jpg *.jpeg"),
@@ -176,90 +265,201 @@ class LicensePlateGUI:
                 ("All Files", "*.*")
             ]
         )
-        
-        if file_path:
-            self.selected_image_path = file_path
-            self.display_image_preview(file_path)
-            self.predict_btn.config(state=tk.NORMAL)
-            self.update_status("Image selected. Ready to recognize.")
-            
-            # Show file info
-            file_name = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path) / 1024  # KB
+
+        if file_paths:
+            self.set_selection(list(file_paths))
+
+    def select_folder(self):
+        """Open directory dialog and select every image inside it"""
+        folder = filedialog.askdirectory(title="Select Folder of License Plate Images")
+        if not folder:
+            return
+        image_paths = batch_recognize.discover_images(folder)
+        if not image_paths:
+            messagebox.showwarning("Warning", "The selected folder contains no images.")
+            return
+        self.set_selection(image_paths)
+
+    def set_selection(self, image_paths):
+        """Remember the images to recognize and preview the first one"""
+        self.selected_image_paths = image_paths
+        self.display_image_preview(image_paths[0])
+        self.predict_btn.config(state=tk.NORMAL)
+
+        # Show file info
+        if len(image_paths) == 1:
+            file_name = os.path.basename(image_paths[0])
+            file_size = os.path.getsize(image_paths[0]) / 1024  # KB
             self.file_info_label.config(text=f"File: {file_name} ({file_size:.1f} KB)")
-    
+            self.update_status("Image selected. Ready to recognize.")
+        else:
+            self.file_info_label.config(text=f"{len(image_paths)} images selected")
+            self.update_status(f"{len(image_paths)} images selected. Ready to recognize.")
+
     def display_image_preview(self, image_path):
-        """Display a preview of the selected image"""
+        """Decode a preview in the background and show it when ready"""
+        self.preview_token += 1
+        token = self.preview_token
+        future = self.preview_executor.submit(load_preview, image_path)
+        # Runs on the preview thread: only hand the future over, never touch Tk here
+        future.add_done_callback(lambda done: self.result_queue.put(('preview', token, done)))
+        self.previews_pending += 1
+        self._start_polling()
+
+    def _show_preview(self, token, future):
+        """Show a decoded preview unless a newer one was requested meanwhile"""
+        if token != self.preview_token:
+            return
         try:
-            # Open and resize image
-            img = Image.open(image_path)
-            img.thumbnail((480, 240), Image.Resampling.LANCZOS)
-            
-            # Convert to PhotoImage
-            photo = ImageTk.PhotoImage(img)
-            
-            # Update label
-            self.preview_label.config(image=photo, text="")
-            self.preview_label.image = photo
+            # PhotoImage must be created on the Tk thread
+            photo = ImageTk.PhotoImage(future.result())
         except Exception as e:
-            messagebox.showerror("Error", f"Could not load image preview:\n{e}")
-    
+            self.preview_label.config(image="", text=f"Could not load preview:\n{e}")
+            self.preview_label.image = None
+            return
+        self.preview_label.config(image=photo, text="")
+        self.preview_label.image = photo
+
+    def on_result_selected(self, event):
+        """Preview the image of the clicked results row"""
+        selection = self.results_table.selection()
+        if selection:
+            self.display_image_preview(self.results_table.item(selection[0], "values")[0])
+
     def predict_license_plate(self):
-        """Run license plate recognition in a separate thread"""
-        if not self.selected_image_path:
+        """Queue every selected image on the worker pool"""
+        if not self.selected_image_paths:
             messagebox.showwarning("Warning", "Please select an image first.")
             return
-        
+
         if self.is_processing:
             messagebox.showinfo("Processing", "Please wait for the current recognition to complete.")
             return
-        
-        # Disable buttons and show processing state
+
+        if self.pool is None:
+            # Each worker loads the model once and keeps a result cache shared across sessions
+            self.pool = ProcessPoolExecutor(max_workers=self.worker_count,
+                                            initializer=batch_recognize._init_worker,
+                                            initargs=({}, result_cache.DEFAULT_CACHE_PATH))
+
+        # Disable selection while the batch runs
         self.is_processing = True
+        self.cancelled = False
+        self.completed = 0
+        self.pending_paths = iter(self.selected_image_paths)
+        self.submitted = {}
         self.select_btn.config(state=tk.DISABLED)
+        self.folder_btn.config(state=tk.DISABLED)
         self.predict_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.results_table.delete(*self.results_table.get_children())
+        self.progress.config(maximum=len(self.selected_image_paths), value=0)
         self.result_text.config(text="Processing...", fg="#3498db")
-        self.update_status("Processing image...")
-        
-        # Run prediction in a separate thread to avoid freezing the GUI
-        thread = threading.Thread(target=self._run_prediction)
-        thread.daemon = True
-        thread.start()
-    
-    def _run_prediction(self):
-        """Background thread for prediction"""
-        try:
-            result = prediction.predict_license_plate(self.selected_image_path)
-            
-            # Update GUI on main thread
-            self.root.after(0, self._display_result, result)
-        except Exception as e:
-            # Update GUI on main thread
-            self.root.after(0, self._display_error, str(e))
-    
-    def _display_result(self, result):
-        """Display the recognition result"""
-        self.is_processing = False
-        self.select_btn.config(state=tk.NORMAL)
-        self.predict_btn.config(state=tk.NORMAL)
-        
-        if result and result != "Plate Not Found":
-            self.result_text.config(text=result, fg=self.success_color)
-            self.update_status(f"✓ Recognition successful: {result}")
+        self.update_status(f"Processing {len(self.selected_image_paths)} image(s)...")
+
+        self._submit_more()
+        self._start_polling()
+
+    def _submit_more(self):
+        """Keep a bounded number of images in flight so cancelling takes effect quickly"""
+        while not self.cancelled and len(self.submitted) < self.worker_count * 2:
+            image_path = next(self.pending_paths, None)
+            if image_path is None:
+                return
+            future = self.pool.submit(batch_recognize._recognize_one, image_path)
+            # Runs on a pool thread: only hand the future over, never touch Tk here
+            future.add_done_callback(lambda done: self.result_queue.put(('result', None, done)))
+            self.submitted[future] = image_path
+
+    def _start_polling(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(50, self._poll_results)
+
+    def _poll_results(self):
+        """Drain finished records and previews on the Tk thread, then refill the pool"""
+        while True:
+            try:
+                kind, token, future = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'preview':
+                self.previews_pending -= 1
+                self._show_preview(token, future)
+                continue
+            image_path = self.submitted.pop(future)
+            try:
+                record = future.result()
+            except CancelledError:
+                # Cancelled before a worker picked it up
+                continue
+            except Exception as e:
+                # The worker process itself failed (e.g. it was killed)
+                record = {'image': image_path, 'plate': None, 'status': 'error', 'error': str(e), 'seconds': 0,
+                          'confidence': None}
+            self._add_result(record)
+
+        if self.is_processing:
+            self._submit_more()
+            if not self.submitted:
+                self._finish_batch()
+        if self.submitted or self.previews_pending:
+            self.root.after(50, self._poll_results)
+        else:
+            self.polling = False
+
+    def _add_result(self, record):
+        """Append one record to the table and advance the progress bar"""
+        self.completed += 1
+        status = record['status'] if record['status'] != 'error' else f"error: {record['error']}"
+        confidence = f"{record['confidence']:.2f}" if record['confidence'] is not None else ""
+        row = self.results_table.insert("", tk.END, values=(record['image'], record['plate'] or "", confidence,
+                                                            status, record['seconds']))
+        self.results_table.see(row)
+        self.progress.config(value=self.completed)
+
+        if record['plate']:
+            self.result_text.config(text=record['plate'], fg=self.success_color)
         else:
             self.result_text.config(text="No Plate Detected", fg="#e74c3c")
-            self.update_status("✗ Could not recognize license plate")
-    
-    def _display_error(self, error_msg):
-        """Display an error message"""
+        self.update_status(f"Processed {self.completed}/{len(self.selected_image_paths)} image(s)")
+
+    def cancel_batch(self):
+        """Stop queueing new images and drop those not yet started; those already running finish normally"""
+        self.cancelled = True
+        for future in list(self.submitted):
+            future.cancel()
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.update_status("Cancelling...")
+
+    def _finish_batch(self):
+        """Re-enable the controls and summarize the batch"""
         self.is_processing = False
         self.select_btn.config(state=tk.NORMAL)
+        self.folder_btn.config(state=tk.NORMAL)
         self.predict_btn.config(state=tk.NORMAL)
-        
-        self.result_text.config(text="Error", fg="#e74c3c")
-        self.update_status(f"✗ Error: {error_msg}")
-        messagebox.showerror("Recognition Error", f"An error occurred:\n{error_msg}")
-    
+        self.cancel_btn.config(state=tk.DISABLED)
+
+        total = len(self.selected_image_paths)
+        if self.cancelled:
+            self.update_status(f"✗ Cancelled after {self.completed}/{total} image(s)")
+        elif total == 1:
+            plate = self.results_table.item(self.results_table.get_children()[0], "values")[1]
+            if plate:
+                self.update_status(f"✓ Recognition successful: {plate}")
+            else:
+                self.update_status("✗ Could not recognize license plate")
+        else:
+            self.update_status(f"✓ Processed {total} images")
+
+    def close(self):
+        """Stop the worker pool and close the window"""
+        self.cancelled = True
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        self.preview_executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
     def update_status(self, message):
         """Update the status label"""
         self.status_label.config(text=message)
@@ -0,0 +1,100 @@
+import numpy as np
+
+# Shares the versioning of the linear .npz models; load() refuses newer files
+FORMAT_VERSION = 1
+
+# Limit the (queries, templates, words) XOR buffer to roughly this many bytes
+MAX_CHUNK_BYTES = 32 * 2**20
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+    def _popcount(words):
+        return _POPCOUNT_TABLE[words.view(np.uint8)].reshape(*words.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def pack_glyphs(X):
+    """Threshold glyph vectors at 0.5 and pack them into 64-bit words (400 px -> 50 bytes -> 7 words)"""
+    bits = np.asarray(X) > 0.5
+    packed = np.packbits(bits, axis=1)
+    padding = (-packed.shape[1]) % 8
+    if padding:
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+class HammingClassifier:
+    """k-nearest-neighbour classifier over bit-packed binary glyphs.
+
+    Distances are XOR + popcount against every packed training glyph; the k nearest
+    vote, and ties go to the class whose voters are closer in total.
+    """
+
+    def __init__(self, k=3, glyph_shape=(20, 20)):
+        self.k = k
+        self.glyph_shape = tuple(glyph_shape)
+
+    def fit(self, X, y):
+        self.classes_, self.template_labels = np.unique(np.asarray(y).astype(str), return_inverse=True)
+        self.templates = pack_glyphs(X)
+        self.n_bits = np.asarray(X).shape[1]
+        return self
+
+    def distances(self, X):
+        """Hamming distance from every query to every training glyph, shape (n_queries, n_templates)"""
+        queries = pack_glyphs(X)
+        n_templates, n_words = self.templates.shape
+        chunk = max(1, MAX_CHUNK_BYTES // (n_templates * n_words * 8))
+        distances = np.empty((len(queries), n_templates), dtype=np.uint16)
+        for start in range(0, len(queries), chunk):
+            xor = queries[start:start + chunk, None, :] ^ self.templates[None, :, :]
+            distances[start:start + chunk] = _popcount(xor).sum(axis=2, dtype=np.uint16)
+        return distances
+
+    def class_scores(self, X):
+        """(votes, total voter distance) per class for the k nearest neighbours"""
+        distances = self.distances(X)
+        k = min(self.k, distances.shape[1])
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        rows = np.arange(len(distances))[:, None]
+        n_classes = len(self.classes_)
+        # Flatten (query, class) pairs so both tallies are a single bincount
+        cells = (rows * n_classes + self.template_labels[nearest]).ravel()
+        size = len(distances) * n_classes
+        votes = np.bincount(cells, minlength=size).reshape(-1, n_classes)
+        total_distance = np.bincount(cells, weights=distances[rows, nearest].ravel(),
+                                     minlength=size).reshape(-1, n_classes)
+        return votes, total_distance
+
+    def predict(self, X):
+        votes, total_distance = self.class_scores(X)
+        # More votes always win; among equal votes the smaller total distance wins
+        ranking = votes * (self.k * self.n_bits + 1) - total_distance
+        return self.classes_[ranking.argmax(axis=1)]
+
+    def predict_proba(self, X):
+        votes, total_distance = self.class_scores(X)
+        return votes / votes.sum(axis=1, keepdims=True)
+
+    def save(self, path):
+        np.savez_compressed(path, format_version=np.array(FORMAT_VERSION), scheme=np.array('hamming'),
+                            classes=self.classes_, template_labels=self.template_labels,
+                            templates=self.templates.view(np.uint8), n_bits=np.array(self.n_bits),
+                            k=np.array(self.k), glyph_shape=np.array(self.glyph_shape))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            version = int(arrays['format_version'])
+            if version > FORMAT_VERSION:
+                raise ValueError(f"{path} uses model format {version}, newer than supported {FORMAT_VERSION}")
+            if str(arrays['scheme']) != 'hamming':
+                raise ValueError(f"{path} is not a Hamming template model")
+            classifier = cls(int(arrays['k']), arrays['glyph_shape'])
+            classifier.classes_ = arrays['classes']
+            classifier.template_labels = arrays['template_labels']
+            classifier.templates = np.ascontiguousarray(arrays['templates']).view(np.uint64)
+            classifier.n_bits = int(arrays['n_bits'])
+        return classifier
@@ -0,0 +1,193 @@
+import bisect
+import contextvars
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Pipeline stages and counters reported by the recognition modules
+STAGES = ('imread', 'to_gray', 'pyramid', 'threshold', 'label', 'candidate_filter', 'select_plate', 'char_resize',
+          'classify')
+COUNTERS = ('candidates_found', 'regions_labelled', 'characters_accepted', 'characters_rejected',
+            'region_searches', 'full_frame_searches', 'cache_hits', 'cache_misses', 'fallback_candidates',
+            'pyramid_retries')
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_active_recorder = contextvars.ContextVar('active_recorder', default=None)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('recorder', 'name', 'start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.record_timing(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def stage(name):
+    """Time a pipeline stage for the active recorder; a shared no-op when recording is off"""
+    recorder = _active_recorder.get()
+    if recorder is None:
+        return _NULL_STAGE
+    return _Stage(recorder, name)
+
+
+def count(name, value=1):
+    """Add to a pipeline counter for the active recorder"""
+    recorder = _active_recorder.get()
+    if recorder is not None:
+        recorder.record_count(name, value)
+
+
+@contextmanager
+def recording(recorder):
+    """Activate recorder for pipeline calls made inside the block (per thread/task)"""
+    token = _active_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _active_recorder.reset(token)
+
+
+class Recorder:
+    """Fans stage timings and counters out to a list of sinks"""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def record_timing(self, name, seconds):
+        for sink in self.sinks:
+            sink.record_timing(name, seconds)
+
+    def record_count(self, name, value):
+        for sink in self.sinks:
+            sink.record_count(name, value)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class HistogramSink:
+    """In-memory bucketed histograms per stage, recent samples for percentiles, and counter totals"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_samples=10000):
+        self.buckets = tuple(buckets)
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.bucket_counts = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self.totals = defaultdict(float)
+        self.samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self.counters = defaultdict(int)
+
+    def record_timing(self, name, seconds):
+        with self.lock:
+            self.bucket_counts[name][bisect.bisect_left(self.buckets, seconds)] += 1
+            self.totals[name] += seconds
+            self.samples[name].append(seconds)
+
+    def record_count(self, name, value):
+        with self.lock:
+            self.counters[name] += value
+
+    def percentile(self, name, q):
+        with self.lock:
+            samples = sorted(self.samples[name])
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+    def summary(self):
+        """Return {'stages': {name: stats}, 'counters': {name: total}}"""
+        stages = {}
+        for name in list(self.totals):
+            calls = sum(self.bucket_counts[name])
+            stages[name] = {
+                'count': calls,
+                'total_seconds': self.totals[name],
+                'mean_seconds': self.totals[name] / calls,
+                'p50_seconds': self.percentile(name, 50),
+                'p95_seconds': self.percentile(name, 95),
+                'p99_seconds': self.percentile(name, 99),
+            }
+        return {'stages': stages, 'counters': dict(self.counters)}
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """Append one JSON object per timing or counter event"""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, 'a')
+
+    def _write(self, event):
+        with self.lock:
+            self.file.write(json.dumps(event) + '\n')
+
+    def record_timing(self, name, seconds):
+        self._write({'ts': time.time(), 'type': 'timing', 'stage': name, 'seconds': seconds})
+
+    def record_count(self, name, value):
+        self._write({'ts': time.time(), 'type': 'counter', 'name': name, 'value': value})
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class PrometheusSink(HistogramSink):
+    """Histogram sink that renders the Prometheus text exposition format"""
+
+    def __init__(self, namespace='lpr', buckets=DEFAULT_BUCKETS):
+        super().__init__(buckets=buckets, max_samples=1)
+        self.namespace = namespace
+
+    def render(self):
+        prefix = self.namespace
+        lines = [
+            f"# HELP {prefix}_stage_seconds Wall time spent in each pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self.lock:
+            for name in sorted(self.bucket_counts):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, self.bucket_counts[name]):
+                    cumulative += bucket_count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                cumulative += self.bucket_counts[name][-1]
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {self.totals[name]}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {cumulative}')
+            for name in sorted(self.counters):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {self.counters[name]}")
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        with open(path, 'w') as output:
+            output.write(self.render())
@@ -0,0 +1,178 @@
+import numpy as np
+
+# Bump when the array layout below changes; load() refuses newer files
+FORMAT_VERSION = 1
+
+# Probabilities are clipped like libsvm's pairwise coupling does
+MIN_PROB = 1e-7
+
+
+def export_linear_svc(model, path, glyph_shape=(20, 20)):
+    """Write a fitted SVC(kernel='linear') as a versioned, pickle-free .npz array file"""
+    if model.kernel != 'linear':
+        raise ValueError(f"Only linear SVC models can be exported, not kernel={model.kernel!r}")
+    arrays = {
+        'format_version': np.array(FORMAT_VERSION),
+        'scheme': np.array('ovo'),
+        'classes': np.asarray(model.classes_).astype(str),
+        'coef': np.asarray(model.coef_, dtype=np.float64),
+        'intercept': np.asarray(model.intercept_, dtype=np.float64),
+        'glyph_shape': np.array(glyph_shape),
+    }
+    prob_a = getattr(model, '_probA', None)
+    if prob_a is not None and len(prob_a):
+        arrays['prob_a'] = np.asarray(prob_a, dtype=np.float64)
+        arrays['prob_b'] = np.asarray(model._probB, dtype=np.float64)
+    np.savez_compressed(path, **arrays)
+
+
+def export_linear_ovr(model, path, glyph_shape=(20, 20)):
+    """Write a fitted one-vs-rest linear classifier, such as an SGDClassifier, as a .npz array file"""
+    np.savez_compressed(path, format_version=np.array(FORMAT_VERSION), scheme=np.array('ovr'),
+                        classes=np.asarray(model.classes_).astype(str),
+                        coef=np.asarray(model.coef_, dtype=np.float64),
+                        intercept=np.asarray(model.intercept_, dtype=np.float64),
+                        glyph_shape=np.array(glyph_shape))
+
+
+class LinearEngine:
+    """Pure-NumPy inference for an exported one-vs-one linear SVC.
+
+    predict() reproduces libsvm's pairwise voting exactly; predict_proba() applies the
+    stored Platt calibration and libsvm's pairwise coupling.
+    """
+
+    def __init__(self, classes, coef, intercept, prob_a=None, prob_b=None, glyph_shape=(20, 20)):
+        self.classes_ = classes
+        self.coef = coef
+        self.intercept = intercept
+        self.prob_a = prob_a
+        self.prob_b = prob_b
+        self.glyph_shape = tuple(glyph_shape)
+        n_classes = len(classes)
+        # Pair k compares classes pair_i[k] and pair_j[k], in libsvm's order
+        self.pair_i, self.pair_j = (np.array(index) for index in np.triu_indices(n_classes, k=1))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            version = int(arrays['format_version'])
+            if version > FORMAT_VERSION:
+                raise ValueError(f"{path} uses model format {version}, newer than supported {FORMAT_VERSION}")
+            if str(arrays['scheme']) != 'ovo':
+                raise ValueError(f"{path} is not a one-vs-one linear model")
+            return cls(arrays['classes'], arrays['coef'], arrays['intercept'],
+                       arrays['prob_a'] if 'prob_a' in arrays else None,
+                       arrays['prob_b'] if 'prob_b' in arrays else None,
+                       arrays['glyph_shape'])
+
+    def decision_function(self, X):
+        """Pairwise decision values, shape (n_samples, n_classes * (n_classes - 1) / 2)"""
+        return np.asarray(X, dtype=np.float64) @ self.coef.T + self.intercept
+
+    def predict(self, X):
+        decisions = self.decision_function(X)
+        n_samples, n_classes = len(decisions), len(self.classes_)
+        # A positive decision is a vote for the first class of the pair
+        winners = np.where(decisions > 0, self.pair_i, self.pair_j)
+        cells = (np.arange(n_samples)[:, None] * n_classes + winners).ravel()
+        votes = np.bincount(cells, minlength=n_samples * n_classes).reshape(n_samples, n_classes)
+        # argmax breaks ties towards the lowest class index, like libsvm
+        return self.classes_[votes.argmax(axis=1)]
+
+    def predict_proba(self, X):
+        if self.prob_a is None:
+            raise ValueError("This model was exported without probability calibration")
+        decisions = self.decision_function(X)
+        pairwise = 1 / (1 + np.exp(decisions * self.prob_a + self.prob_b))
+        pairwise = np.clip(pairwise, MIN_PROB, 1 - MIN_PROB)
+        n_classes = len(self.classes_)
+        r = np.zeros((len(decisions), n_classes, n_classes))
+        r[:, self.pair_i, self.pair_j] = pairwise
+        r[:, self.pair_j, self.pair_i] = 1 - pairwise
+        return couple_pairwise_probabilities(r)
+
+
+class OneVsRestEngine:
+    """Pure-NumPy inference for an exported one-vs-rest linear model.
+
+    predict() picks the highest decision; predict_proba() normalizes the per-class
+    logistic scores, as sklearn does for linear models trained with log loss.
+    """
+
+    def __init__(self, classes, coef, intercept, glyph_shape=(20, 20)):
+        self.classes_ = classes
+        self.coef = coef
+        self.intercept = intercept
+        self.glyph_shape = tuple(glyph_shape)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            version = int(arrays['format_version'])
+            if version > FORMAT_VERSION:
+                raise ValueError(f"{path} uses model format {version}, newer than supported {FORMAT_VERSION}")
+            if str(arrays['scheme']) != 'ovr':
+                raise ValueError(f"{path} is not a one-vs-rest linear model")
+            return cls(arrays['classes'], arrays['coef'], arrays['intercept'], arrays['glyph_shape'])
+
+    def decision_function(self, X):
+        """Per-class decision values, shape (n_samples, n_classes)"""
+        decisions = np.asarray(X, dtype=np.float64) @ self.coef.T + self.intercept
+        if decisions.shape[1] == 1:
+            # Two classes share one hyperplane; a positive decision is the second class
+            decisions = np.hstack([-decisions, decisions])
+        return decisions
+
+    def predict(self, X):
+        return self.classes_[self.decision_function(X).argmax(axis=1)]
+
+    def predict_proba(self, X):
+        from scipy.special import expit
+        scores = expit(self.decision_function(X))
+        sums = scores.sum(axis=1, keepdims=True)
+        # A glyph every class rejects outright gets no preference rather than NaN
+        return np.divide(scores, sums, out=np.full_like(scores, 1 / scores.shape[1]), where=sums > 0)
+
+
+def couple_pairwise_probabilities(r):
+    """Vectorized libsvm multiclass_probability (Wu, Lin and Weng's second method).
+
+    r[n, i, j] is the probability that class i beats class j for sample n.
+    """
+    n_samples, k = r.shape[:2]
+    Q = -r.transpose(0, 2, 1) * r
+    diagonal = np.arange(k)
+    Q[:, diagonal, diagonal] = (r ** 2).sum(axis=1) - r[:, diagonal, diagonal] ** 2
+    p = np.full((n_samples, k), 1 / k)
+    active = np.arange(n_samples)
+    eps = 0.005 / k
+    for _ in range(max(100, k)):
+        Qa, pa = Q[active], p[active]
+        Qp = np.einsum('nij,nj->ni', Qa, pa)
+        pQp = np.einsum('ni,ni->n', pa, Qp)
+        converged = np.abs(Qp - pQp[:, None]).max(axis=1) < eps
+        active, Qa, pa, Qp, pQp = (a[~converged] for a in (active, Qa, pa, Qp, pQp))
+        if len(active) == 0:
+            break
+        for t in range(k):
+            Qtt = Qa[:, t, t]
+            diff = (-Qp[:, t] + pQp) / Qtt
+            pa[:, t] += diff
+            scale = 1 + diff
+            pQp = (pQp + diff * (diff * Qtt + 2 * Qp[:, t])) / scale ** 2
+            Qp = (Qp + diff[:, None] * Qa[:, t, :]) / scale[:, None]
+            pa /= scale[:, None]
+        p[active] = pa
+    return p
+
+
+if __name__ == "__main__":
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export a pickled linear SVC to the .npz model format")
+    parser.add_argument('pickle_path', help="joblib-pickled SVC(kernel='linear')")
+    parser.add_argument('output_path', help="where to write the .npz model")
+    args = parser.parse_args()
+    export_linear_svc(joblib.load(args.pickle_path), args.output_path)
@@ -1,51 +1,103 @@
+import argparse
 import os
+import time
 import numpy as np
 from sklearn.svm import SVC
-from sklearn.model_selection import cross_val_score
+from sklearn.model_selection import cross_val_score, StratifiedKFold
 import joblib
-from skimage.io import imread
-from skimage.filters import threshold_otsu
-
-letters = [
-            '0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'A', 'B', 'C', 'D',
-            'E', 'F', 'G', 'H', 'J', 'K', 'L', 'M', 'N', 'P', 'Q', 'R', 'S', 'T',
-            'U', 'V', 'W', 'X', 'Y', 'Z'
-        ]
+import dataset
+import linear_engine
+from hamming_engine import HammingClassifier
+
 def read_training_data(training_directory):
-    image_data = []
-    target_data = []
-    for each_letter in letters:
-        for each in range(10):
-            image_path = os.path.join(training_directory, each_letter, each_letter + '_' + str(each) + '.jpg')
-            if not os.path.exists(image_path):
-                print(f"Missing file: {image_path}")
-                continue
-            img_details = imread(image_path, as_gray=True)
-            binary_image = img_details < threshold_otsu(img_details)
-            flat_bin_image = binary_image.reshape(-1)
-            image_data.append(flat_bin_image)
-            target_data.append(each_letter)
-    return np.array(image_data), np.array(target_data)
+    image_data, target_data, glyph_shape = dataset.load_dataset(training_directory)
+    return image_data, target_data
 
 def cross_validation(model, num_of_fold, train_data, train_label):
     accuracy_result = cross_val_score(model, train_data, train_label, cv=num_of_fold)
     print("Cross Validation Result for ", str(num_of_fold), " -fold")
 
     print(accuracy_result * 100)
+
+def fit_linear_engine(train_data, train_label):
+    """Fit a linear SVC and return the NumPy engine the recognizer would run it with"""
+    svc_model = SVC(kernel='linear').fit(train_data, train_label)
+    return linear_engine.LinearEngine(svc_model.classes_.astype(str), svc_model.coef_, svc_model.intercept_)
+
+def compare_engines(engine_fitters, num_of_fold, train_data, train_label):
+    """Cross-validate every engine on the same folds; returns {name: (accuracy, chars/sec)}"""
+    folds = list(StratifiedKFold(num_of_fold, shuffle=True, random_state=0).split(train_data, train_label))
+    comparison = {}
+    for name, fit in engine_fitters.items():
+        correct = 0
+        seconds = 0.0
+        for train_index, test_index in folds:
+            model = fit(train_data[train_index], train_label[train_index])
+            start = time.perf_counter()
+            predicted = model.predict(train_data[test_index])
+            seconds += time.perf_counter() - start
+            correct += np.count_nonzero(predicted == train_label[test_index])
+        comparison[name] = (correct / len(train_label), len(train_label) / seconds)
+    return comparison
 current_dir = os.path.dirname(os.path.realpath(__file__))
 
-training_dataset_dir = r"C:\Users\lepqr\Desktop\license-plate-recognition\lpr\train20X20"
-image_data, target_data = read_training_data(training_dataset_dir)
+DEFAULT_OUTPUTS = {
+    'svc': os.path.join(current_dir, 'models/svc/svc.pkl'),
+    'hamming': os.path.join(current_dir, 'models/hamming/hamming.npz'),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the character classifier")
+    parser.add_argument('--dataset', default=dataset.DEFAULT_DATASET_DIR,
+                        help="glyph directory with one sub-directory per character")
+    parser.add_argument('--cache-dir', default=dataset.DEFAULT_CACHE_DIR, help="feature store directory")
+    parser.add_argument('--refresh', action='store_true', help="re-decode every glyph instead of using the store")
+    parser.add_argument('--workers', type=int, default=None, help="parallel decoding threads")
+    parser.add_argument('--engine', choices=sorted(DEFAULT_OUTPUTS), default='svc',
+                        help="classifier to train (default: svc)")
+    parser.add_argument('--k', type=int, default=3, help="neighbours that vote in the hamming engine")
+    parser.add_argument('--compare', action='store_true',
+                        help="cross-validate every engine on the same folds and report accuracy and chars/sec")
+    parser.add_argument('--output', default=None,
+                        help="where to save the trained model (default: models/svc/svc.pkl or "
+                             "models/hamming/hamming.npz)")
+    args = parser.parse_args(argv)
+
+    image_data, target_data, glyph_shape = dataset.load_dataset(args.dataset, args.cache_dir,
+                                                                workers=args.workers, refresh=args.refresh)
+    print(f"Loaded {len(image_data)} glyphs of shape {glyph_shape} from {args.dataset}")
+
+    if args.compare:
+        engine_fitters = {
+            'svc': fit_linear_engine,
+            'hamming': lambda X, y: HammingClassifier(args.k, glyph_shape).fit(X, y),
+        }
+        for name, (accuracy, chars_per_sec) in compare_engines(engine_fitters, 4, image_data, target_data).items():
+            print(f"{name:<8} accuracy {accuracy * 100:6.2f}%  {chars_per_sec:12.0f} chars/sec")
+        return
+
+    output = args.output or DEFAULT_OUTPUTS[args.engine]
+    save_directory = os.path.dirname(os.path.abspath(output))
+    if not os.path.exists(save_directory):
+        os.makedirs(save_directory)
+
+    if args.engine == 'hamming':
+        HammingClassifier(args.k, glyph_shape).fit(image_data, target_data).save(output)
+        return
+
+
+    svc_model = SVC(kernel='linear', probability=True)
 
+    cross_validation(svc_model, 4, image_data, target_data)
 
-svc_model = SVC(kernel='linear', probability=True)
+    svc_model.fit(image_data, target_data)
 
-cross_validation(svc_model, 4, image_data, target_data)
 
-svc_model.fit(image_data, target_data)
+    joblib.dump(svc_model, output)
+    # Pickle-free copy used by the recognizer by default
+    linear_engine.export_linear_svc(svc_model, os.path.splitext(output)[0] + '.npz', glyph_shape)
 
 
-save_directory = os.path.join(current_dir, 'models/svc/')
-if not os.path.exists(save_directory):
-    os.makedirs(save_directory)
-joblib.dump(svc_model, save_directory+'/svc.pkl')
+if __name__ == "__main__":
+    main()
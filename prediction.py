@@ -1,54 +1,287 @@
+import importlib
 import os
+import cca
 import segmentation
-import joblib
 import numpy as np
+import instrumentation
+import result_cache
+from linear_engine import LinearEngine, OneVsRestEngine
+from hamming_engine import HammingClassifier
+from results import PlateResult, PLATE_NOT_FOUND, NO_CHARACTERS
 
-def predict_license_plate(image_path):
-    result = segmentation.segmentation(image_path)
-    if result == "Plate Not Found":
+current_dir = os.path.dirname(os.path.realpath(__file__))
+MODEL_PATH = os.path.join(current_dir, 'models/svc/svc.npz')
+PICKLE_MODEL_PATH = os.path.join(current_dir, 'models/svc/svc.pkl')
+HAMMING_MODEL_PATH = os.path.join(current_dir, 'models/hamming/hamming.npz')
+
+# Models selectable by name, e.g. from the --engine options of the command-line tools
+ENGINES = {
+    'svc': MODEL_PATH,
+    'hamming': HAMMING_MODEL_PATH,
+}
+NPZ_ENGINES = {
+    'ovo': LinearEngine,
+    'ovr': OneVsRestEngine,
+    'hamming': HammingClassifier,
+}
+
+# Plate readings whose weakest character is at least this confident are accepted without
+# reading further candidates. Suitable values depend on how the model is calibrated.
+DEFAULT_CONFIDENCE_THRESHOLD = 0.0
+
+# Plate candidates read per image at most, best geometric score first
+DEFAULT_MAX_CANDIDATES = 3
+
+# Imported lazily by the pipeline; warm_up() loads them ahead of the first image
+PIPELINE_MODULES = ('scipy.ndimage', 'skimage.io', 'skimage.color', 'skimage.filters', 'skimage.measure',
+                    'skimage.transform', 'skimage.util', 'PIL.Image')
+
+
+def resolve_model_path(model_path):
+    """Map an ENGINES name to its model file; other paths are returned unchanged"""
+    return ENGINES.get(model_path, model_path)
+
+
+def load_model(model_path):
+    """Load an exported .npz model (linear SVC, one-vs-rest linear or Hamming templates), or any joblib-pickled estimator"""
+    model_path = resolve_model_path(model_path)
+    if model_path.endswith('.npz'):
+        with np.load(model_path) as arrays:
+            scheme = str(arrays['scheme'])
+        if scheme not in NPZ_ENGINES:
+            raise ValueError(f"{model_path} contains an unknown model scheme {scheme!r}")
+        return NPZ_ENGINES[scheme].load(model_path)
+    import joblib
+    return joblib.load(model_path)
+
+
+def preload_pipeline_modules():
+    """Import every heavy module the recognition pipeline uses"""
+    for module_name in PIPELINE_MODULES:
+        importlib.import_module(module_name)
+
+
+def character_confidences(model, batch, predictions):
+    """Probability the model gives each predicted character, or None if it can't estimate probabilities"""
+    try:
+        probabilities = model.predict_proba(batch)
+    except (AttributeError, ValueError):
+        # Pickled SVCs trained without probability=True, or linear models exported without calibration
+        return None
+    columns = {label: column for column, label in enumerate(model.classes_)}
+    return probabilities[np.arange(len(batch)), [columns[label] for label in predictions]]
+
+
+def synthetic_plate_frame():
+    """Small 8-bit frame with one light plate holding a row of dark glyph-sized bars, to exercise every stage"""
+    frame = np.full((200, 400), 60, dtype=np.uint8)
+    frame[80:120, 140:260] = 220
+    for left in range(150, 250, 16):
+        frame[90:110, left:left + 10] = 20
+    return frame
+
+
+class PlateRecognizer:
+    """Long-lived recognizer that loads the classifier once and reuses it.
+
+    model_path is a model file or an ENGINES name ('svc', 'hamming'); characters are
+    resized to the model's glyph_shape. Runs headless by default; pass a debug hook
+    such as debug_view.DebugVisualizer to print and plot every pipeline step. Set max_working_size to locate plates
+    on a downscaled pyramid level of large frames (see cca.cca). Pass a
+    result_cache.ResultCache to reuse results for images whose bytes were seen before.
+    low_memory keeps images 8-bit end to end and lets the JPEG decoder downscale
+    towards max_working_size (see cca.cca_uint8).
+
+    Plate candidates are read best geometric score first; a reading whose confidence
+    is below confidence_threshold falls back to the next candidate, up to
+    max_candidates, and the most confident reading wins.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, debug=None, max_working_size=None, pyramid_scale=cca.PYRAMID_SCALE,
+                 cache=None, low_memory=False, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+                 max_candidates=DEFAULT_MAX_CANDIDATES):
+        self.model_path = model_path
+        self.model = load_model(model_path)
+        # Models trained on other glyph sets (e.g. train10X20) record their input shape
+        self.glyph_shape = tuple(int(size) for size in getattr(self.model, 'glyph_shape', segmentation.GLYPH_SHAPE))
+        self.debug = debug
+        self.max_working_size = max_working_size
+        self.pyramid_scale = pyramid_scale
+        self.low_memory = low_memory
+        self.confidence_threshold = confidence_threshold
+        self.max_candidates = max_candidates
+        self.cache = cache
+        self.fingerprint = None
+        if cache is not None:
+            # Hashing the model file means replacing it invalidates every cached result
+            self.fingerprint = result_cache.recognizer_fingerprint(
+                resolve_model_path(model_path), glyph_shape=self.glyph_shape,
+                max_working_size=max_working_size, pyramid_scale=pyramid_scale, low_memory=low_memory,
+                confidence_threshold=confidence_threshold, max_candidates=max_candidates)
+
+    def warm_up(self):
+        """Pay import and first-call costs now by running a synthetic frame through the pipeline.
+
+        Bypasses the result cache and the debug hook.
+        """
+        preload_pipeline_modules()
+        segmented = segmentation.segmentation(synthetic_plate_frame(), max_working_size=self.max_working_size,
+                                              pyramid_scale=self.pyramid_scale, glyph_shape=self.glyph_shape,
+                                              low_memory=self.low_memory)
+        characters = segmented.characters if len(segmented.characters) else np.zeros((1, *self.glyph_shape))
+        self.read_characters(characters)
+        return self
+
+    def classify_characters(self, characters):
+        """Classify an (N, *glyph_shape) array, or a sequence, of characters with a single model call"""
+        if len(characters) == 0:
+            return np.array([], dtype=str)
+        # Flatten every character into one (N, 400) matrix for 20x20 glyphs
+        if isinstance(characters, np.ndarray):
+            batch = characters.reshape(len(characters), -1)
+        else:
+            batch = np.stack([each_character.reshape(-1) for each_character in characters])
+        with instrumentation.stage('classify'):
+            return self.model.predict(batch)
+
+    def read_characters(self, characters):
+        """Classify characters like classify_characters; returns (predictions, confidences or None)"""
+        if len(characters) == 0:
+            return np.array([], dtype=str), np.array([])
+        batch = np.asarray(characters).reshape(len(characters), -1)
+        with instrumentation.stage('classify'):
+            predictions = self.model.predict(batch)
+            return predictions, character_confidences(self.model, batch, predictions)
+
+    def read_plate(self, segmented, predictions=None, confidences=None):
+        """PlateResult for one segmented candidate, classifying its characters unless predictions are given"""
+        if not segmented.plate_found:
+            return PlateResult(candidate_scores=segmented.candidate_scores, status=PLATE_NOT_FOUND)
+        if len(segmented.characters) == 0:
+            return PlateResult(plate_bbox=segmented.plate_bbox, candidate_scores=segmented.candidate_scores,
+                               status=NO_CHARACTERS)
+        if predictions is None:
+            predictions, confidences = self.read_characters(segmented.characters)
+        result = build_plate_result(predictions, segmented, confidences)
+        if self.debug is not None:
+            self.debug.plate_recognized(predictions, result.text)
+        return result
+
+    def is_confident(self, result):
+        """Whether a reading is good enough to stop reading further candidates"""
+        return result.found and (result.confidence is None or result.confidence >= self.confidence_threshold)
+
+    def read_fallback_candidates(self, result, candidates):
+        """Read further candidates of one image until one is confident; returns the best reading.
+
+        result is the reading of the first candidate and candidates the rest of
+        segmentation.segment_candidates for the same image.
+        """
+        for _ in range(self.max_candidates - 1):
+            if self.is_confident(result):
+                break
+            segmented = next(candidates, None)
+            if segmented is None:
+                break
+            instrumentation.count('fallback_candidates')
+            result = more_confident(result, self.read_plate(segmented))
         return result
-    characters, column_list = result
-    
-    print(f"\nCharacters received: {len(characters)}")
-    print(f"Column list: {column_list}")
-    
-    if len(characters) == 0:
-        return "No characters detected"
-    
-    current_dir = os.path.dirname(os.path.realpath(__file__))
-    model_dir = os.path.join(current_dir, 'models/svc/svc.pkl')
-    model = joblib.load(model_dir)
-
-    classification_result = []
-    for idx, each_character in enumerate(characters):
-        # Ensure the character is properly flattened
-        print(f"Character {idx} shape before reshape: {each_character.shape}")
-        flat_char = each_character.reshape(1, -1)
-        print(f"Character {idx} shape after reshape: {flat_char.shape}")
-        result = model.predict(flat_char)
-        classification_result.append(result)
-        print(f"Character {idx} prediction: {result[0]}")
-
-    print(f"\nAll predictions: {classification_result}")
-
-    plate_string = ''
-    for eachPredict in classification_result:
-        plate_string += eachPredict[0]
-
-    print(f"Plate string (unsorted): {plate_string}")
 
+    def recognize(self, image_path, search_region=None):
+        """Recognize the plate in a single image file or decoded frame"""
+        return self.recognize_batch([image_path], [search_region])[0]
+
+    def recognize_batch(self, image_paths, search_regions=None):
+        """Recognize plates in several images, classifying all their characters at once.
+
+        search_regions optionally restricts each image's plate search to a
+        (minRow, minCol, maxRow, maxCol) box; None searches the whole frame.
+        """
+        if search_regions is None:
+            search_regions = [None] * len(image_paths)
+        results = [None] * len(image_paths)
+        cache_keys = [None] * len(image_paths)
+        # Only results computed here are written back; hits are already cached
+        misses = []
+        pending = []
+        all_characters = []
+        character_count = 0
+        for idx, (image_path, search_region) in enumerate(zip(image_paths, search_regions)):
+            if self.cache is not None:
+                cache_keys[idx] = result_cache.cache_key(result_cache.image_digest(image_path),
+                                                         self.fingerprint, search_region)
+                results[idx] = self.cache.get(cache_keys[idx])
+                if results[idx] is not None:
+                    continue
+                misses.append(idx)
+            candidates = segmentation.segment_candidates(image_path, debug=self.debug,
+                                                         max_working_size=self.max_working_size,
+                                                         pyramid_scale=self.pyramid_scale,
+                                                         glyph_shape=self.glyph_shape,
+                                                         search_region=search_region,
+                                                         low_memory=self.low_memory)
+            segmented = next(candidates)
+            if not segmented.plate_found or len(segmented.characters) == 0:
+                results[idx] = self.read_fallback_candidates(self.read_plate(segmented), candidates)
+                continue
+            pending.append((idx, character_count, segmented, candidates))
+            all_characters.append(segmented.characters)
+            character_count += len(segmented.characters)
+
+        # The best candidate of every image is classified in one call; only poor readings
+        # go on to read their next candidates one image at a time
+        predictions, confidences = self.read_characters(np.concatenate(all_characters) if all_characters else [])
+
+        for idx, start, segmented, candidates in pending:
+            end = start + len(segmented.characters)
+            result = self.read_plate(segmented, predictions[start:end],
+                                     confidences[start:end] if confidences is not None else None)
+            results[idx] = self.read_fallback_candidates(result, candidates)
+
+        if self.cache is not None:
+            for idx in misses:
+                self.cache.put(cache_keys[idx], results[idx])
+        return results
+
+
+def build_plate_result(predictions, segmented, confidences=None):
+    """Join per-character predictions left to right by their column position"""
     # Sort characters by their column position (left to right)
-    if len(column_list) != len(plate_string):
-        print(f"WARNING: column_list length ({len(column_list)}) != plate_string length ({len(plate_string)})")
-        return plate_string
-    
-    column_list_copy = column_list[:]
-    column_list.sort()
-    rightplate_string = ''
-    for each in column_list:
-        idx = column_list_copy.index(each)
-        rightplate_string += plate_string[idx]
-        print(f"Sorted position: column={each} -> char='{plate_string[idx]}'")
-
-    print(f"Plate string (sorted): {rightplate_string}")
-    return rightplate_string
\ No newline at end of file
+    order = np.argsort(segmented.column_list, kind='stable')
+    char_confidences = [float(confidences[idx]) for idx in order] if confidences is not None else []
+    return PlateResult(
+        text=''.join(predictions[idx] for idx in order),
+        plate_bbox=segmented.plate_bbox,
+        char_boxes=[segmented.char_boxes[idx] for idx in order],
+        confidence=min(char_confidences) if char_confidences else None,
+        char_confidences=char_confidences,
+        candidate_scores=segmented.candidate_scores,
+    )
+
+
+def more_confident(result, other):
+    """The better of two readings: plates with characters first, then the higher confidence"""
+    def rank(reading):
+        return reading.found, reading.confidence if reading.confidence is not None else 0.0
+    # Ties keep the reading of the better-scoring candidate
+    return other if rank(other) > rank(result) else result
+
+
+_default_recognizer = None
+
+
+def get_recognizer():
+    """Return the shared recognizer, loading the model on first use"""
+    global _default_recognizer
+    if _default_recognizer is None:
+        _default_recognizer = PlateRecognizer(cache=result_cache.ResultCache())
+    return _default_recognizer
+
+
+def warm_up():
+    """Load the shared recognizer and warm it up, e.g. while a worker process starts"""
+    return get_recognizer().warm_up()
+
+
+def predict_license_plate(image_path):
+    return get_recognizer().recognize(image_path)
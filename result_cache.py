@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import instrumentation
+from results import PlateResult
+
+# Bump when a pipeline change alters results for the same image, model and options
+CACHE_VERSION = 5
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(current_dir, '.cache', 'results.sqlite')
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_DISK_BYTES = 64 * 2**20
+
+# Read files in chunks so hashing large frames doesn't load them twice into memory
+_HASH_CHUNK = 2**20
+
+
+def image_digest(image):
+    """Hash of an image file's bytes, or of a decoded frame's shape, dtype and pixels"""
+    digest = hashlib.sha1()
+    if isinstance(image, np.ndarray):
+        digest.update(f"{image.shape}{image.dtype}".encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+    with open(image, 'rb') as image_file:
+        for chunk in iter(lambda: image_file.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def recognizer_fingerprint(model_path, **options):
+    """Hash of the model file's contents and the recognizer options that affect results"""
+    described = ','.join(f"{name}={options[name]}" for name in sorted(options))
+    return hashlib.sha1(f"v{CACHE_VERSION}\0{image_digest(model_path)}\0{described}".encode()).hexdigest()
+
+
+def cache_key(image_digest_hex, recognizer_fingerprint, search_region=None):
+    return hashlib.sha1(f"{image_digest_hex}\0{recognizer_fingerprint}\0{search_region}".encode()).hexdigest()
+
+
+def result_from_dict(record):
+    """Rebuild a PlateResult from PlateResult.to_dict(), restoring the tuple boxes JSON turned into lists"""
+    record = dict(record)
+    if record.get('plate_bbox') is not None:
+        record['plate_bbox'] = tuple(record['plate_bbox'])
+    record['char_boxes'] = [tuple(box) for box in record.get('char_boxes', [])]
+    return PlateResult(**record)
+
+
+class DiskTier:
+    """sqlite table of JSON results, evicting least recently used rows past max_bytes.
+
+    Hits only note their access time; the notes are written with the next put, or
+    once touch_batch of them have piled up, so reads stay read-only transactions. The
+    table size is tracked as rows are written and recounted every resync_interval
+    puts to take in rows written by other processes sharing the file.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_DISK_BYTES, touch_batch=64, resync_interval=256):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_batch = touch_batch
+        self.resync_interval = resync_interval
+        self.touched = {}
+        self.puts_since_resync = 0
+        # Several batch workers may share one file; sqlite serializes their writes
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                                "last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.connection.commit()
+        self.total_bytes = self.table_bytes()
+
+    def table_bytes(self):
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def get(self, key):
+        row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.touched[key] = time.time()
+        if len(self.touched) >= self.touch_batch:
+            with self.connection:
+                self.flush_touched()
+        return json.loads(row[0])
+
+    def flush_touched(self):
+        """Write the access times of recent hits; runs inside the caller's transaction"""
+        if self.touched:
+            self.connection.executemany("UPDATE results SET last_used = ? WHERE key = ?",
+                                        [(last_used, key) for key, last_used in self.touched.items()])
+            self.touched.clear()
+
+    def put(self, key, record):
+        value = json.dumps(record)
+        with self.connection:
+            self.flush_touched()
+            replaced = self.connection.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                    (key, value, len(value), time.time()))
+            self.total_bytes += len(value) - (replaced[0] if replaced else 0)
+            self.puts_since_resync += 1
+            if self.puts_since_resync >= self.resync_interval or self.total_bytes > self.max_bytes:
+                self.total_bytes = self.table_bytes()
+                self.puts_since_resync = 0
+            if self.total_bytes > self.max_bytes:
+                self.total_bytes -= self.evict(self.total_bytes - self.max_bytes)
+
+    def evict(self, excess_bytes):
+        """Delete least recently used rows until at least excess_bytes are freed; returns the bytes freed"""
+        doomed = []
+        freed = 0
+        for key, size in self.connection.execute("SELECT key, size FROM results ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess_bytes:
+                break
+        self.connection.executemany("DELETE FROM results WHERE key = ?", doomed)
+        return freed
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM results")
+        self.touched.clear()
+        self.total_bytes = 0
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        with self.connection:
+            self.flush_touched()
+        self.connection.close()
+
+
+class ResultCache:
+    """Two-tier cache of recognition results keyed by content, not by path.
+
+    A bounded in-memory LRU tier sits in front of an optional sqlite disk tier;
+    disk hits are promoted to memory. Keys include the recognizer fingerprint, so
+    results from another model file or other options are never returned.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, disk_path=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.disk = DiskTier(disk_path, max_disk_bytes) if disk_path else None
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Cached PlateResult for key, or None"""
+        with self.lock:
+            record = self.memory.get(key)
+            if record is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+            elif self.disk is not None:
+                record = self.disk.get(key)
+                if record is not None:
+                    self.disk_hits += 1
+                    self._remember(key, record)
+            if record is None:
+                self.misses += 1
+        instrumentation.count('cache_hits' if record is not None else 'cache_misses')
+        return result_from_dict(record) if record is not None else None
+
+    def put(self, key, result):
+        record = result.to_dict()
+        with self.lock:
+            self._remember(key, record)
+            if self.disk is not None:
+                self.disk.put(key, record)
+
+    def _remember(self, key, record):
+        self.memory[key] = record
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def stats(self):
+        """Hit and miss counters plus the current size of each tier"""
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_entries': len(self.memory),
+                'disk_entries': len(self.disk) if self.disk is not None else 0,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.disk is not None:
+                self.disk.clear()
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
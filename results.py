@@ -0,0 +1,63 @@
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+# Boxes are (min_row, min_col, max_row, max_col) in full-image coordinates
+
+PLATE_FOUND = 'ok'
+PLATE_NOT_FOUND = 'plate_not_found'
+NO_CHARACTERS = 'no_characters'
+
+
+@dataclass
+class SegmentationResult:
+    """Characters cut out of the selected plate, in region order, as one (N, rows, cols) array"""
+    characters: list = field(default_factory=list)
+    column_list: list = field(default_factory=list)
+    char_boxes: list = field(default_factory=list)
+    plate_bbox: Optional[tuple] = None
+    candidate_scores: list = field(default_factory=list)
+
+    @property
+    def plate_found(self):
+        return self.plate_bbox is not None
+
+
+@dataclass
+class PlateResult:
+    """Recognition result for one image; char_boxes and char_confidences are ordered like text.
+
+    confidence is the lowest character confidence, or None for models that give no probabilities.
+    """
+    text: Optional[str] = None
+    plate_bbox: Optional[tuple] = None
+    char_boxes: list = field(default_factory=list)
+    confidence: Optional[float] = None
+    char_confidences: list = field(default_factory=list)
+    candidate_scores: list = field(default_factory=list)
+    status: str = PLATE_FOUND
+
+    @property
+    def found(self):
+        return self.status == PLATE_FOUND
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class VehicleResult:
+    """Plate read for one tracked vehicle, voted character by character over its frames.
+
+    agreement is the lowest share of readings that agreed with the chosen character
+    at any position.
+    """
+    track_id: int
+    text: str
+    first_frame: int
+    last_frame: int
+    readings: int
+    agreement: float
+    plate_bbox: Optional[tuple] = None
+
+    def to_dict(self):
+        return asdict(self)
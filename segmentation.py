@@ -1,152 +1,232 @@
+from dataclasses import dataclass
+from typing import Optional
+
 import numpy as np
-from skimage.transform import resize
-from skimage.filters import threshold_otsu
-from skimage import measure
-from skimage.measure import regionprops
-import matplotlib.patches as patches
-import matplotlib.pyplot as plt
 import cca
+import instrumentation
+from results import SegmentationResult
+
+# Candidates outside these bounds are rejected before any thresholding or labelling.
+# They are far looser than the 2-5 aspect ratio that earns scoring points, so only
+# shapes that could never be read as a plate are skipped.
+MIN_CANDIDATE_ASPECT = 1.0
+MAX_CANDIDATE_ASPECT = 8.0
+MIN_CANDIDATE_HEIGHT = 15
+
+# (rows, cols) every character is resized to before classification
+GLYPH_SHAPE = (20, 20)
+
+
+@dataclass
+class PlateCandidate:
+    """A scored plate candidate with the binary and labelled plate computed while scoring"""
+    index: int
+    gray_plate: np.ndarray
+    score: int
+    license_plate: Optional[np.ndarray] = None  # inverted binary: white characters on black
+    region_boxes: Optional[np.ndarray] = None  # (minRow, minCol, maxRow, maxCol) per labelled region
+    character_dimensions: Optional[tuple] = None
+
+
+def analyze_candidate(idx, candidate, debug=None):
+    """Score one candidate, rejecting impossible shapes before thresholding it"""
+    from skimage import measure
+    from skimage.filters import threshold_otsu
+    h, w = candidate.shape
+    aspect_ratio = w / h
+    if not (MIN_CANDIDATE_ASPECT <= aspect_ratio <= MAX_CANDIDATE_ASPECT) or h < MIN_CANDIDATE_HEIGHT:
+        if debug is not None:
+            debug.candidate_pruned(idx, h, w, aspect_ratio)
+        return PlateCandidate(idx, candidate, 0)
+
+    # 8-bit crops from the low-memory path are thresholded as floats, like the default
+    # path, so a plate reads the same whichever way its frame was decoded
+    candidate = candidate.astype(np.float64, copy=False)
+    thresh = threshold_otsu(candidate)
+    binary_plate = candidate > thresh
+    license_plate = np.logical_not(binary_plate)
+    labelled_plate, region_count = measure.label(license_plate, return_num=True)
+    region_boxes = cca.component_boxes(labelled_plate, region_count)[1]
+
+    # Calculate character-like region count
+    char_height_min = 0.35 * h
+    char_height_max = 0.60 * h
+    char_width_min = 0.05 * w
+    char_width_max = 0.15 * w
+
+    region_h = region_boxes[:, 2] - region_boxes[:, 0]
+    region_w = region_boxes[:, 3] - region_boxes[:, 1]
+    char_count = int(np.count_nonzero((char_height_min <= region_h) & (region_h <= char_height_max) &
+                                      (char_width_min <= region_w) & (region_w <= char_width_max)))
+
+    # Scoring heuristics:
+    score = 0
+
+    # 1. License plates are typically wider than tall (aspect ratio 2-5)
+    if 2.0 <= aspect_ratio <= 5.0:
+        score += 10
+
+    # 2. Should have region count between 4-10
+    if 4 <= region_count <= 10:
+        score += 5
+
+    # 3. Should have character-like regions (at least 4)
+    if char_count >= 4:
+        score += (char_count * 2)  # Higher weight for more character-like regions
+
+    if debug is not None:
+        debug.candidate_scored(idx, h, w, aspect_ratio, region_count, char_count, score)
+
+    character_dimensions = (char_height_min, char_height_max, char_width_min, char_width_max)
+    return PlateCandidate(idx, candidate, score, license_plate, region_boxes, character_dimensions)
+
+def rank_candidates(plate_like_objects, debug=None):
+    """Score every candidate and return (plate-like candidates best score first, scores).
+
+    Equal scores keep their detection order.
+    """
+    if debug is not None:
+        debug.candidates_analyzed(len(plate_like_objects))
+
+    analyzed = [analyze_candidate(idx, candidate, debug=debug) for idx, candidate in enumerate(plate_like_objects)]
+    scores = [candidate.score for candidate in analyzed]
+    ranked = sorted((candidate for candidate in analyzed if candidate.score > 0), key=lambda candidate: -candidate.score)
+    return ranked, scores
+
+def select_plate(plate_like_objects, debug=None):
+    """Score every candidate and return (best_candidate, scores).
+
+    best_candidate is None when no candidate looks like a plate.
+    """
+    ranked, scores = rank_candidates(plate_like_objects, debug=debug)
+    if not ranked:
+        return None, scores
+    if debug is not None:
+        debug.plate_selected(ranked[0].score)
+    return ranked[0], scores
+
+def segmentation(image_path, debug=None, max_working_size=None, pyramid_scale=cca.PYRAMID_SCALE,
+                 glyph_shape=GLYPH_SHAPE, search_region=None, low_memory=False):
+    """Cut the characters out of the best-scoring plate candidate"""
+    return next(segment_candidates(image_path, debug, max_working_size, pyramid_scale, glyph_shape,
+                                   search_region, low_memory))
+
+def segment_candidates(image_path, debug=None, max_working_size=None, pyramid_scale=cca.PYRAMID_SCALE,
+                       glyph_shape=GLYPH_SHAPE, search_region=None, low_memory=False):
+    """Yield a SegmentationResult for every plate-like candidate, best score first.
+
+    Characters are only cut out of a candidate when it is requested, so callers that
+    stop at the first good reading never segment the rest. A single not-found result
+    is yielded when no candidate looks like a plate.
+    """
+    # The multiscale search ranks each pyramid level's candidates to decide whether to
+    # search a finer one; the ranking of the level it settles on is kept, not redone
+    rankings = {}
+
+    def plate_found(plate_like_objects):
+        with instrumentation.stage('select_plate'):
+            rankings[id(plate_like_objects)] = rank_candidates(plate_like_objects, debug=debug)
+        return bool(rankings[id(plate_like_objects)][0])
+
+    if low_memory:
+        plate_like_objects, plate_objects_cordinates, decode_scale = cca.cca_uint8(
+            image_path, debug=debug, max_working_size=max_working_size, pyramid_scale=pyramid_scale,
+            search_region=search_region, accept=plate_found)
+    else:
+        plate_like_objects, plate_objects_cordinates = cca.cca(image_path, debug=debug,
+                                                               max_working_size=max_working_size,
+                                                               pyramid_scale=pyramid_scale,
+                                                               search_region=search_region, accept=plate_found)
+        decode_scale = 1.0
+    if id(plate_like_objects) in rankings:
+        ranked, scores = rankings[id(plate_like_objects)]
+    else:
+        with instrumentation.stage('select_plate'):
+            ranked, scores = rank_candidates(plate_like_objects, debug=debug)
+    if not ranked:
+        yield SegmentationResult(candidate_scores=scores)
+        return
+
+    for candidate in ranked:
+        if debug is not None:
+            debug.plate_selected(candidate.score)
+        yield segment_candidate(candidate, plate_objects_cordinates[candidate.index], decode_scale, scores,
+                                debug=debug, glyph_shape=glyph_shape)
+
+def segment_candidate(candidate, plate_bbox, decode_scale, scores, debug=None, glyph_shape=GLYPH_SHAPE):
+    """Extract one scored candidate's characters, with boxes in full-image coordinates"""
+    characters, column_list, char_boxes = extract_characters(candidate, debug=debug, glyph_shape=glyph_shape)
+
+    # Report character boxes in full-image coordinates
+    top, left = plate_bbox[0], plate_bbox[1]
+    char_boxes = [(y0 + top, x0 + left, y1 + top, x1 + left) for y0, x0, y1, x1 in char_boxes]
+    if decode_scale != 1:
+        # The decoder downscaled the image; report boxes in stored-image pixels
+        plate_bbox = cca.scale_box(plate_bbox, 1 / decode_scale)
+        char_boxes = [cca.scale_box(box, 1 / decode_scale) for box in char_boxes]
+    return SegmentationResult(characters, column_list, char_boxes, plate_bbox, scores)
+
+def sample_indices(lengths, size):
+    """Source offset of each of size output cells for regions of the given lengths, shape (N, size).
+
+    Nearest-neighbour cell centres, the grid skimage.transform.resize samples with order=0
+    (its default for boolean images such as the inverted plate).
+    """
+    lengths = np.asarray(lengths, dtype=np.intp)[:, None]
+    offsets = ((np.arange(size) + 0.5)[None, :] * lengths / size).astype(np.intp)
+    return np.minimum(offsets, lengths - 1)
+
+def normalize_characters(plates, char_boxes, plate_indices=None, glyph_shape=GLYPH_SHAPE):
+    """Resample character boxes from one or many plates into one contiguous (N, *glyph_shape) array.
+
+    plates is a 2-D image or a sequence of them, char_boxes an (N, 4) array of
+    (minRow, minCol, maxRow, maxCol) boxes and plate_indices the plate of each box
+    (all the first plate by default). Every character is gathered with a single
+    fancy index and equals resize(plate[box], glyph_shape) for boolean plates.
+    """
+    if isinstance(plates, np.ndarray):
+        plates = [plates]
+    char_boxes = np.asarray(char_boxes, dtype=np.intp).reshape(-1, 4)
+    if plate_indices is None:
+        plate_indices = np.zeros(len(char_boxes), dtype=np.intp)
+    rows, cols = glyph_shape
+
+    if len(plates) == 1:
+        pixels = plates[0].ravel()
+    else:
+        pixels = np.concatenate([plate.ravel() for plate in plates])
+    plate_offsets = np.cumsum([0] + [plate.size for plate in plates[:-1]])[plate_indices]
+    plate_widths = np.array([plate.shape[1] for plate in plates], dtype=np.intp)[plate_indices]
+
+    row_index = char_boxes[:, 0, None] + sample_indices(char_boxes[:, 2] - char_boxes[:, 0], rows)
+    col_index = char_boxes[:, 1, None] + sample_indices(char_boxes[:, 3] - char_boxes[:, 1], cols)
+    flat_index = ((plate_offsets[:, None, None] + row_index[:, :, None] * plate_widths[:, None, None]) +
+                  col_index[:, None, :])
+    return pixels[flat_index]
+
+def extract_characters(candidate, debug=None, glyph_shape=GLYPH_SHAPE):
+    """Cut out and resize the character regions of a scored plate; boxes are in plate coordinates.
+
+    Characters come back as one (N, *glyph_shape) array, ready for batched classification.
+    """
+    # The plate was already inverted during scoring: white characters on black background
+    license_plate = candidate.license_plate
+    min_height, max_height, min_width, max_width = candidate.character_dimensions
+
+    with instrumentation.stage('char_resize'):
+        region_boxes = candidate.region_boxes
+        region_height = region_boxes[:, 2] - region_boxes[:, 0]
+        region_width = region_boxes[:, 3] - region_boxes[:, 1]
+        accepted = ((min_height < region_height) & (region_height < max_height) &
+                    (min_width < region_width) & (region_width < max_width))
+        characters = normalize_characters(license_plate, region_boxes[accepted], glyph_shape=glyph_shape)
+        char_boxes = [tuple(box) for box in region_boxes[accepted].tolist()]
+        column_list = [x0 for y0, x0, y1, x1 in char_boxes]
+        rejected = [tuple(box) for box in region_boxes[~accepted].tolist()]
+    instrumentation.count('characters_accepted', len(characters))
+    instrumentation.count('characters_rejected', len(rejected))
 
-def select_plate(plate_like_objects):
-
-    best_candidate = None
-    best_score = -1
-    best_regions = None
-    best_char_dims = None
-    
-    print(f"\nAnalyzing {len(plate_like_objects)} plate-like objects:")
-    
-    for idx, candidate in enumerate(plate_like_objects):
-        h, w = candidate.shape
-        aspect_ratio = w / h
-        
-        thresh = threshold_otsu(candidate)
-        binary_plate = candidate > thresh
-        license_plate = np.logical_not(binary_plate)
-        labelled_plate = measure.label(license_plate)
-        regions = list(regionprops(labelled_plate))
-        region_count = len(regions)
-        
-        print(f"\n  Object {idx}: h={h}, w={w}, aspect_ratio={aspect_ratio:.2f}, regions={region_count}")
-        
-        # Calculate character-like region count
-        char_height_min = 0.35 * h
-        char_height_max = 0.60 * h
-        char_width_min = 0.05 * w
-        char_width_max = 0.15 * w
-        
-        char_count = 0
-        for region in regions:
-            y0, x0, y1, x1 = region.bbox
-            region_h = y1 - y0
-            region_w = x1 - x0
-            if char_height_min <= region_h <= char_height_max and char_width_min <= region_w <= char_width_max:
-                char_count += 1
-        
-        # Scoring heuristics:
-        score = 0
-        
-        # 1. License plates are typically wider than tall (aspect ratio 2-5)
-        if 2.0 <= aspect_ratio <= 5.0:
-            score += 10
-            print(f"    ✓ Good aspect ratio: {aspect_ratio:.2f}")
-        else:
-            print(f"    ✗ Bad aspect ratio: {aspect_ratio:.2f} (expected 2-5)")
-        
-        # 2. Should have region count between 4-10
-        if 4 <= region_count <= 10:
-            score += 5
-            print(f"    ✓ Good region count: {region_count}")
-        else:
-            print(f"    ✗ Bad region count: {region_count} (expected 4-10)")
-        
-        # 3. Should have character-like regions (at least 4)
-        if char_count >= 4:
-            score += (char_count * 2)  # Higher weight for more character-like regions
-            print(f"    ✓ Character-like regions: {char_count}")
-        else:
-            print(f"    ✗ Few character-like regions: {char_count} (expected 4+)")
-        
-        print(f"    Score: {score}")
-        
-        if score > best_score:
-            best_score = score
-            best_candidate = candidate
-            best_regions = regions
-            character_dimensions = (char_height_min, char_height_max, char_width_min, char_width_max)
-            best_char_dims = character_dimensions
-    
-    if best_candidate is not None and best_score > 0:
-        print(f"\n✓ Selected object with score {best_score}")
-        return best_candidate, best_regions, best_char_dims
-    
-    return "Plate Not Found"
-def segmentation(image_path):
-    plate_like_objects, plate_objects_cordinates = cca.cca(image_path)
-    result = select_plate(plate_like_objects)
-    if result == "Plate Not Found":
-        return result
-    
-    gray_plate, char_regions, character_dimensions = result
-    
-    # CRITICAL: Invert the plate image to get white characters on black background
-    thresh = threshold_otsu(gray_plate)
-    binary_plate = gray_plate > thresh
-    license_plate = np.logical_not(binary_plate)  # INVERT for correct character extraction
-    
-    min_height, max_height, min_width, max_width = character_dimensions
-    
-    print("Character dimension thresholds:")
-    print(f"  Height: {min_height:.2f} < h < {max_height:.2f}")
-    print(f"  Width: {min_width:.2f} < w < {max_width:.2f}")
-
-    print("Number of regions detected:", len(list(char_regions)))
-    characters = []
-    column_list = []
-
-    fig, ax1 = plt.subplots(1, figsize=(12, 4))
-    ax1.imshow(license_plate, cmap="gray")
-    ax1.set_title("Detected Character Regions")
-
-    for regions in char_regions:
-        y0, x0, y1, x1 = regions.bbox
-        region_height = y1 - y0
-        region_width = x1 - x0
-        
-        # Debug: print region dimensions
-        print(f"Region: height={region_height:.2f}, width={region_width:.2f}")
-
-        if min_height < region_height < max_height and min_width < region_width < max_width:
-            roi = license_plate[y0:y1, x0:x1]  # Extract from INVERTED image
-            # Draw accepted rectangle in GREEN
-            rect_border = patches.Rectangle((x0, y0), x1 - x0, y1 - y0, edgecolor="green",
-                                           linewidth=2, fill=False)
-            ax1.add_patch(rect_border)
-            resized_char = resize(roi, (20, 20))
-            characters.append(resized_char)
-            column_list.append(x0)
-            print(f"  ✓ Accepted")
-        else:
-            # Draw rejected rectangle in RED
-            rect_border = patches.Rectangle((x0, y0), x1 - x0, y1 - y0, edgecolor="red",
-                                           linewidth=2, fill=False, linestyle="--")
-            ax1.add_patch(rect_border)
-            print(f"  ✗ Rejected")
-    
-
-    
-    # DEBUG: Show extracted characters
-    if len(characters) > 0:
-        fig_chars, axes = plt.subplots(1, len(characters), figsize=(3*len(characters), 3))
-        if len(characters) == 1:
-            axes = [axes]
-        for idx, char in enumerate(characters):
-            axes[idx].imshow(char, cmap="gray")
-            axes[idx].set_title(f"Char {idx}\nCol: {column_list[idx]}")
-            axes[idx].axis('off')
-        plt.tight_layout()
-        plt.show()
-    
-    print("Characters extracted:", len(characters))
-    print("Column list:", column_list)
-    return characters, column_list
+    if debug is not None:
+        debug.character_regions(license_plate, candidate.character_dimensions, char_boxes, rejected)
+        debug.characters_extracted(characters, column_list)
+    return characters, column_list, char_boxes
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from email import policy
+from email.parser import BytesParser
+from http import HTTPStatus
+
+import numpy as np
+
+import cca
+import instrumentation
+import prediction
+import segmentation
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT = 0.005
+DEFAULT_MAX_QUEUE = 64
+MAX_BODY_BYTES = 20 * 2**20
+MAX_HEADER_BYTES = 64 * 2**10
+
+
+def _init_segmentation_worker(segmentation_options):
+    """Import the pipeline and segment a synthetic frame before the first upload arrives"""
+    prediction.preload_pipeline_modules()
+    segmentation.segmentation(prediction.synthetic_plate_frame(), **segmentation_options)
+
+
+def _segment_upload(image_bytes, segmentation_options, start=0, stop=1):
+    """Decode an uploaded image and cut out the characters of its candidates ranked start to stop.
+
+    Runs in a worker process. The first call takes only the best candidate; the
+    next ones are segmented in a second call when its reading is not confident.
+    """
+    import imageio.v3 as iio
+    frame = iio.imread(image_bytes)
+    return list(itertools.islice(segmentation.segment_candidates(frame, **segmentation_options), start, stop))
+
+
+def upload_bytes(content_type, body):
+    """Image bytes from a raw image body or the first file part of a multipart/form-data body"""
+    if not content_type.startswith('multipart/form-data'):
+        return body
+    message = BytesParser(policy=policy.HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    for part in message.iter_parts():
+        if part.get_filename() is not None or part.get_content_type().startswith('image/'):
+            return part.get_payload(decode=True)
+    raise ValueError("multipart body has no file part")
+
+
+class CharacterBatcher:
+    """Gather segmented characters from concurrent requests into one classifier call.
+
+    A batch is classified once it holds max_batch_size characters or max_wait
+    seconds after its first request arrived, whichever comes first. Requests get
+    back (predictions, confidences or None) for their characters.
+    """
+
+    def __init__(self, recognizer, metrics, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT):
+        self.recognizer = recognizer
+        self.metrics = metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        # Classification stays off the event loop but never runs two batches at once
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def classify(self, characters):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((characters, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            all_characters = np.concatenate([characters for characters, future in batch])
+            try:
+                predictions, confidences = await loop.run_in_executor(self.executor, self.recognizer.read_characters,
+                                                                      all_characters)
+            except Exception as e:
+                for characters, future in batch:
+                    future.set_exception(e)
+                continue
+            self.metrics.record_count('batches_classified', 1)
+            self.metrics.record_count('characters_classified', len(all_characters))
+            start = 0
+            for characters, future in batch:
+                end = start + len(characters)
+                future.set_result((predictions[start:end], confidences[start:end] if confidences is not None else None))
+                start = end
+
+
+class RecognitionService:
+    """asyncio HTTP front end: segmentation in a process pool, micro-batched classification in-process.
+
+    POST /recognize takes a raw image body or a multipart/form-data upload and
+    answers with PlateResult.to_dict() as JSON. At most max_queue requests are in
+    flight; further requests are answered 429 at once. GET /health reports queue
+    depth and GET /metrics exposes request and batch metrics in Prometheus format.
+    """
+
+    def __init__(self, recognizer, workers=None, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT,
+                 max_queue=DEFAULT_MAX_QUEUE):
+        self.recognizer = recognizer
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.metrics = instrumentation.PrometheusSink()
+        self.batcher = CharacterBatcher(recognizer, self.metrics, max_batch_size, max_wait)
+        self.segmentation_options = {
+            'max_working_size': recognizer.max_working_size,
+            'pyramid_scale': recognizer.pyramid_scale,
+            'glyph_shape': recognizer.glyph_shape,
+        }
+        self.pool = None
+
+    async def segment(self, image_bytes, start, stop):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        candidates = await loop.run_in_executor(self.pool, _segment_upload, image_bytes, self.segmentation_options,
+                                                start, stop)
+        self.metrics.record_timing('segment', time.perf_counter() - started)
+        return candidates
+
+    async def read_candidate(self, segmented):
+        if not segmented.plate_found or len(segmented.characters) == 0:
+            return self.recognizer.read_plate(segmented)
+        start = time.perf_counter()
+        predictions, confidences = await self.batcher.classify(segmented.characters)
+        self.metrics.record_timing('classify_wait', time.perf_counter() - start)
+        return self.recognizer.read_plate(segmented, np.asarray(predictions), confidences)
+
+    async def recognize(self, image_bytes):
+        best, = await self.segment(image_bytes, 0, 1)
+        result = await self.read_candidate(best)
+        if not best.plate_found or self.recognizer.is_confident(result) or self.recognizer.max_candidates < 2:
+            return result
+
+        # Candidates come best geometric score first; stop at the first confident reading
+        for segmented in await self.segment(image_bytes, 1, self.recognizer.max_candidates):
+            if self.recognizer.is_confident(result):
+                break
+            self.metrics.record_count('fallback_candidates', 1)
+            result = prediction.more_confident(result, await self.read_candidate(segmented))
+        return result
+
+    async def handle_request(self, method, path, headers, body):
+        """Return (status, content type, body bytes) for one parsed request"""
+        route = path.split('?', 1)[0]
+        if route == '/health':
+            health = {'status': 'ok', 'in_flight': self.in_flight, 'max_queue': self.max_queue,
+                      'workers': self.workers, 'model': str(self.recognizer.model_path)}
+            return HTTPStatus.OK, 'application/json', json.dumps(health).encode()
+        if route == '/metrics':
+            text = self.metrics.render()
+            text += f"# TYPE lpr_requests_in_flight gauge\nlpr_requests_in_flight {self.in_flight}\n"
+            return HTTPStatus.OK, 'text/plain; version=0.0.4', text.encode()
+        if route != '/recognize':
+            return HTTPStatus.NOT_FOUND, 'application/json', b'{"error": "not found"}'
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, 'application/json', b'{"error": "use POST"}'
+
+        if self.in_flight >= self.max_queue:
+            self.metrics.record_count('requests_rejected', 1)
+            return HTTPStatus.TOO_MANY_REQUESTS, 'application/json', b'{"error": "recognition queue is full"}'
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            image_bytes = upload_bytes(headers.get('content-type', ''), body)
+            result = await self.recognize(image_bytes)
+        except Exception as e:
+            self.metrics.record_count('requests_failed', 1)
+            error = {'error': f"{type(e).__name__}: {e}"}
+            return HTTPStatus.BAD_REQUEST, 'application/json', json.dumps(error).encode()
+        finally:
+            self.in_flight -= 1
+            self.metrics.record_timing('request', time.perf_counter() - start)
+        return HTTPStatus.OK, 'application/json', json.dumps(result.to_dict()).encode()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, path, version = request_line.split(' ')
+                except ValueError:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, 'text/plain', b'bad request line', False)
+                    break
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'application/json',
+                                       b'{"error": "image too large"}', False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, content_type, payload = await self.handle_request(method, path, headers, body)
+                await self.respond(writer, status, content_type, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, content_type, payload, keep_alive):
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            head += "Retry-After: 1\r\n"
+        writer.write(head.encode() + b"\r\n" + payload)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        self.recognizer.warm_up()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_segmentation_worker,
+                                        initargs=(self.segmentation_options,))
+        batcher_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        print(f"Serving on http://{host}:{port} with {self.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+            self.pool.shutdown(cancel_futures=True)
+            self.batcher.executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve license plate recognition over HTTP")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="image processing worker processes (default: CPU count)")
+    parser.add_argument('--engine', default='svc',
+                        help="classifier: 'svc', 'hamming' or a model file path (default: svc)")
+    parser.add_argument('--max-working-size', type=int, default=None,
+                        help="locate plates on a downscaled copy whose longest side fits this many pixels")
+    parser.add_argument('--pyramid-scale', type=float, default=cca.PYRAMID_SCALE,
+                        help="downscale factor between pyramid levels (default: 0.5)")
+    parser.add_argument('--confidence-threshold', type=float, default=prediction.DEFAULT_CONFIDENCE_THRESHOLD,
+                        help="read the next plate candidate when a reading is less confident (default: 0)")
+    parser.add_argument('--max-candidates', type=int, default=prediction.DEFAULT_MAX_CANDIDATES,
+                        help="plate candidates read per image at most (default: 3)")
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="characters classified together at most (default: 64)")
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT * 1000,
+                        help="longest a character waits for its batch to fill (default: 5)")
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help="requests in flight before new ones get 429 (default: 64)")
+    args = parser.parse_args(argv)
+
+    recognizer = prediction.PlateRecognizer(args.engine, max_working_size=args.max_working_size,
+                                            pyramid_scale=args.pyramid_scale,
+                                            confidence_threshold=args.confidence_threshold,
+                                            max_candidates=args.max_candidates)
+    service = RecognitionService(recognizer, args.workers, args.max_batch_size, args.max_wait_ms / 1000,
+                                 args.max_queue)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+from collections import Counter
+
+import instrumentation
+import prediction
+from grayscale import SUPPORTED_EXTENSIONS
+from results import VehicleResult
+
+# The search region around a tracked plate grows by this fraction of the plate width on every side
+ROI_PADDING = 0.5
+
+# Frames searched only around the tracked plate before the whole frame is searched again
+REDETECT_INTERVAL = 30
+
+# Consecutive frames without a plate before the vehicle is considered gone
+MAX_MISSED_FRAMES = 5
+
+
+def iter_frames(source, step=1):
+    """Yield (frame_index, RGB/gray array) from a directory of sequential images or a video file.
+
+    Directory frames are taken in file name order; video files are decoded with
+    imageio, which needs a video plugin such as pyav or imageio-ffmpeg.
+    """
+    import imageio.v3 as iio
+    from skimage.io import imread
+    if os.path.isdir(source):
+        frame_paths = [os.path.join(source, filename) for filename in sorted(os.listdir(source))
+                       if filename.lower().endswith(SUPPORTED_EXTENSIONS)]
+        for frame_index in range(0, len(frame_paths), step):
+            with instrumentation.stage('imread'):
+                frame = imread(frame_paths[frame_index])
+            yield frame_index, frame
+        return
+
+    for frame_index, frame in enumerate(iio.imiter(source)):
+        if frame_index % step == 0:
+            yield frame_index, frame
+
+
+def vote_plate(readings):
+    """Combine plate strings read from several frames into (text, agreement).
+
+    Readings of the most common length vote separately at every character position.
+    """
+    lengths = Counter(len(text) for text in readings)
+    # Dropped characters are more common than extra ones, so equal counts favour the longer reading
+    length = max(lengths, key=lambda n: (lengths[n], n))
+    candidates = [text for text in readings if len(text) == length]
+
+    characters = []
+    agreement = 1.0
+    for position in range(length):
+        character, votes = Counter(text[position] for text in candidates).most_common(1)[0]
+        characters.append(character)
+        agreement = min(agreement, votes / len(readings))
+    return ''.join(characters), agreement
+
+
+class PlateTrack:
+    """Readings collected for one vehicle while its plate stays in view"""
+
+    def __init__(self, track_id, frame_index):
+        self.track_id = track_id
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.plate_bbox = None
+        self.readings = []
+        self.missed = 0
+
+    def add(self, frame_index, result):
+        self.last_frame = frame_index
+        self.plate_bbox = result.plate_bbox
+        self.readings.append(result.text)
+        self.missed = 0
+
+    def to_result(self):
+        text, agreement = vote_plate(self.readings)
+        return VehicleResult(self.track_id, text, self.first_frame, self.last_frame,
+                             len(self.readings), agreement, self.plate_bbox)
+
+
+class StreamRecognizer:
+    """Recognize plates in consecutive frames of a fixed camera.
+
+    While a plate is tracked only a padded region around its last box is searched;
+    the whole frame is searched again every redetect_interval frames or as soon as
+    the region comes up empty. Plates found within the tracked region belong to the
+    same vehicle, whose readings are voted into one string when its track ends.
+    """
+
+    def __init__(self, recognizer=None, roi_padding=ROI_PADDING, redetect_interval=REDETECT_INTERVAL,
+                 max_missed_frames=MAX_MISSED_FRAMES):
+        # Video frames never repeat, so the default recognizer skips the result cache
+        self.recognizer = recognizer if recognizer is not None else prediction.PlateRecognizer()
+        self.roi_padding = roi_padding
+        self.redetect_interval = redetect_interval
+        self.max_missed_frames = max_missed_frames
+        self.track = None
+        self.next_track_id = 0
+        self.frames_since_full_search = 0
+
+    def search_region(self, frame_shape):
+        """Padded (minRow, minCol, maxRow, maxCol) box around the tracked plate"""
+        top, left, bottom, right = self.track.plate_bbox
+        padding = int(round(self.roi_padding * (right - left)))
+        return (max(0, top - padding), max(0, left - padding),
+                min(frame_shape[0], bottom + padding), min(frame_shape[1], right + padding))
+
+    def in_tracked_region(self, plate_bbox, frame_shape):
+        top, left, bottom, right = self.search_region(frame_shape)
+        center_row = (plate_bbox[0] + plate_bbox[2]) / 2
+        center_col = (plate_bbox[1] + plate_bbox[3]) / 2
+        return top <= center_row < bottom and left <= center_col < right
+
+    def process_frame(self, frame_index, frame):
+        """Recognize one frame; returns (PlateResult, vehicles whose track ended on this frame)"""
+        finished = []
+        result = None
+        tracking = self.track is not None and self.track.plate_bbox is not None
+        if tracking and self.frames_since_full_search < self.redetect_interval:
+            instrumentation.count('region_searches')
+            result = self.recognizer.recognize(frame, self.search_region(frame.shape))
+            self.frames_since_full_search += 1
+        if result is None or not result.found:
+            instrumentation.count('full_frame_searches')
+            result = self.recognizer.recognize(frame)
+            self.frames_since_full_search = 0
+
+        if result.found:
+            if tracking and not self.in_tracked_region(result.plate_bbox, frame.shape):
+                finished.append(self.end_track())
+            if self.track is None:
+                self.track = PlateTrack(self.next_track_id, frame_index)
+                self.next_track_id += 1
+            self.track.add(frame_index, result)
+        elif self.track is not None:
+            self.track.missed += 1
+            if self.track.missed > self.max_missed_frames:
+                finished.append(self.end_track())
+        return result, finished
+
+    def end_track(self):
+        vehicle = self.track.to_result()
+        self.track = None
+        return vehicle
+
+    def finish(self):
+        """End the current track, if any, once the stream is exhausted"""
+        return [self.end_track()] if self.track is not None else []
+
+    def run(self, frames):
+        """Yield a VehicleResult for every vehicle in an iterable of (frame_index, frame) pairs"""
+        for frame_index, frame in frames:
+            result, finished = self.process_frame(frame_index, frame)
+            yield from finished
+        yield from self.finish()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recognize license plates in a video or a directory of frames")
+    parser.add_argument('source', help="video file or directory of sequential frame images")
+    parser.add_argument('-o', '--output', help="write one JSON line per vehicle to this file")
+    parser.add_argument('--step', type=int, default=1, help="only process every n-th frame (default: 1)")
+    parser.add_argument('--engine', default='svc',
+                        help="classifier: 'svc', 'hamming' or a model file path (default: svc)")
+    parser.add_argument('--max-working-size', type=int, default=None,
+                        help="locate plates on a downscaled copy whose longest side fits this many pixels")
+    parser.add_argument('--roi-padding', type=float, default=ROI_PADDING,
+                        help="search region padding as a fraction of the plate width (default: 0.5)")
+    parser.add_argument('--redetect-interval', type=int, default=REDETECT_INTERVAL,
+                        help="frames between full-frame searches while tracking (default: 30)")
+    parser.add_argument('--max-missed', type=int, default=MAX_MISSED_FRAMES,
+                        help="frames without a plate before a vehicle is considered gone (default: 5)")
+    args = parser.parse_args(argv)
+
+    recognizer = prediction.PlateRecognizer(args.engine, max_working_size=args.max_working_size)
+    stream = StreamRecognizer(recognizer, args.roi_padding, args.redetect_interval, args.max_missed)
+    output_file = open(args.output, 'w') if args.output else None
+    try:
+        for vehicle in stream.run(iter_frames(args.source, args.step)):
+            print(f"Vehicle {vehicle.track_id}: {vehicle.text} (frames {vehicle.first_frame}-{vehicle.last_frame}, "
+                  f"{vehicle.readings} readings, {vehicle.agreement * 100:.0f}% agreement)")
+            if output_file is not None:
+                output_file.write(json.dumps(vehicle.to_dict()) + '\n')
+                output_file.flush()
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+import dataset
+import linear_engine
+import segmentation
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_OUTPUT = os.path.join(current_dir, 'models', 'sgd', 'sgd.npz')
+
+DEFAULT_BATCH_SIZE = 512
+# Augmented copies of every glyph per pass, next to the clean glyph itself
+DEFAULT_AUGMENTATIONS = 7
+DEFAULT_CHECKPOINT_EVERY = 200
+
+# Augmentation strengths
+MAX_SHIFT = 2
+NOISE_RATE = 0.03
+BLUR_SIGMA = 0.8
+
+
+def list_samples(sources):
+    """(path, label) pairs of every glyph under the source directories, without decoding any"""
+    samples = []
+    for source in sources:
+        samples.extend(dataset.discover_images(source))
+    return samples
+
+
+def load_glyph(image_path, glyph_shape):
+    """Binarized glyph resized to glyph_shape the way segmentation resizes characters.
+
+    Harvested crops must be stored like train20X20: dark characters on a light background.
+    """
+    glyph = dataset.decode_glyph(image_path)
+    if glyph.shape != glyph_shape:
+        glyph = segmentation.normalize_characters(glyph, [(0, 0, *glyph.shape)], glyph_shape=glyph_shape)[0]
+    return glyph
+
+
+def augment(glyphs, rng):
+    """Randomly shift, thicken or thin, blur and speckle a batch of (N, rows, cols) boolean glyphs"""
+    from scipy import ndimage
+    count, rows, cols = glyphs.shape
+
+    # Shift every glyph independently with one gather from a zero-padded stack
+    padded = np.pad(glyphs, ((0, 0), (MAX_SHIFT, MAX_SHIFT), (MAX_SHIFT, MAX_SHIFT)))
+    row_shift, col_shift = rng.integers(-MAX_SHIFT, MAX_SHIFT + 1, size=(2, count))
+    glyphs = padded[np.arange(count)[:, None, None],
+                    (MAX_SHIFT - row_shift)[:, None, None] + np.arange(rows)[None, :, None],
+                    (MAX_SHIFT - col_shift)[:, None, None] + np.arange(cols)[None, None, :]]
+
+    # A third of the glyphs get thicker strokes and a third thinner ones
+    structure = np.ones((1, 3, 3), dtype=bool)
+    stroke = rng.integers(0, 3, size=count)
+    glyphs[stroke == 1] = ndimage.binary_dilation(glyphs[stroke == 1], structure)
+    glyphs[stroke == 2] = ndimage.binary_erosion(glyphs[stroke == 2], structure, border_value=0)
+
+    blurred = rng.random(count) < 0.5
+    glyphs[blurred] = ndimage.gaussian_filter(glyphs[blurred].astype(np.float32), (0, BLUR_SIGMA, BLUR_SIGMA)) > 0.5
+
+    return glyphs ^ (rng.random(glyphs.shape) < NOISE_RATE)
+
+
+def epoch_batches(samples, epoch, seed, glyph_shape=segmentation.GLYPH_SHAPE, batch_size=DEFAULT_BATCH_SIZE,
+                  augmentations=DEFAULT_AUGMENTATIONS, skip=0):
+    """Yield (X, y) mini-batches for one shuffled pass over samples, decoding glyphs as they are needed.
+
+    Only one batch of glyphs is ever in memory. Shuffling and augmentation are seeded
+    by (seed, epoch, batch), so the first skip batches of a pass can be skipped
+    without decoding them and every later batch is the same as in an uninterrupted run.
+    """
+    order = np.random.default_rng([seed, epoch]).permutation(len(samples))
+    glyphs_per_batch = max(1, batch_size // (augmentations + 1))
+    for batch, start in enumerate(range(0, len(order), glyphs_per_batch)):
+        if batch < skip:
+            continue
+        rng = np.random.default_rng([seed, epoch, batch])
+        picked = [samples[index] for index in order[start:start + glyphs_per_batch]]
+        glyphs = np.stack([load_glyph(image_path, glyph_shape) for image_path, label in picked])
+        labels = np.array([label for image_path, label in picked])
+        variants = [glyphs] + [augment(glyphs, rng) for _ in range(augmentations)]
+        yield np.concatenate(variants).reshape(-1, glyph_shape[0] * glyph_shape[1]), np.tile(labels, len(variants))
+
+
+def evaluate(model, samples, glyph_shape=segmentation.GLYPH_SHAPE, batch_size=DEFAULT_BATCH_SIZE):
+    """Accuracy on the clean glyphs of samples, decoded a batch at a time"""
+    correct = 0
+    for start in range(0, len(samples), batch_size):
+        picked = samples[start:start + batch_size]
+        glyphs = np.stack([load_glyph(image_path, glyph_shape).reshape(-1) for image_path, label in picked])
+        correct += np.count_nonzero(model.predict(glyphs) == np.array([label for image_path, label in picked]))
+    return correct / len(samples)
+
+
+def new_model(alpha=1e-4):
+    """Incremental linear classifier; log loss gives probabilities for confidences, averaging steadies SGD"""
+    return SGDClassifier(loss='log_loss', alpha=alpha, average=True, random_state=0)
+
+
+def save_checkpoint(path, model, state):
+    """Write the model and training progress, replacing the previous checkpoint atomically"""
+    tmp_path = path + '.tmp'
+    joblib.dump({'model': model, 'state': state}, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    checkpoint = joblib.load(path)
+    return checkpoint['model'], checkpoint['state']
+
+
+def train(model, samples, state, epochs, checkpoint_path, checkpoint_every=DEFAULT_CHECKPOINT_EVERY,
+          validation=None, progress=True):
+    """Fit model with partial_fit on streamed augmented batches until state['epoch'] reaches epochs.
+
+    state holds 'seed', 'epoch', 'batch' (batches done in the current epoch),
+    'classes', 'glyph_shape', 'batch_size' and 'augmentations'; it is updated in
+    place and saved with the model every checkpoint_every batches and after every epoch.
+    """
+    classes = np.array(state['classes'])
+    glyph_shape = tuple(state['glyph_shape'])
+    unknown = {label for image_path, label in samples} - set(classes)
+    if unknown:
+        raise ValueError(f"Labels {sorted(unknown)} are not classes of the model being trained")
+
+    while state['epoch'] < epochs:
+        start = time.perf_counter()
+        for X, y in epoch_batches(samples, state['epoch'], state['seed'], glyph_shape, state['batch_size'],
+                                  state['augmentations'], skip=state['batch']):
+            model.partial_fit(X, y, classes=classes)
+            state['batch'] += 1
+            state['samples_seen'] += len(y)
+            if state['batch'] % checkpoint_every == 0:
+                save_checkpoint(checkpoint_path, model, state)
+        state['epoch'] += 1
+        state['batch'] = 0
+        save_checkpoint(checkpoint_path, model, state)
+        if progress:
+            message = (f"epoch {state['epoch']}/{epochs}: {state['samples_seen']} samples seen, "
+                       f"{time.perf_counter() - start:.1f}s")
+            if validation:
+                message += f", clean-glyph accuracy {evaluate(model, validation, glyph_shape) * 100:.2f}%"
+            print(message)
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Train a linear character classifier incrementally on streamed, augmented glyphs")
+    parser.add_argument('sources', nargs='*',
+                        help="glyph directories with one sub-directory per character (default: train20X20)")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT,
+                        help="exported .npz model (default: models/sgd/sgd.npz)")
+    parser.add_argument('--checkpoint', default=None,
+                        help="checkpoint file written while training (default: next to the output, .ckpt)")
+    parser.add_argument('--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY,
+                        help="batches between checkpoints (default: 200)")
+    parser.add_argument('--resume', action='store_true', help="continue the run saved in --checkpoint")
+    parser.add_argument('--fine-tune', metavar='CHECKPOINT',
+                        help="start from the model in this checkpoint, e.g. to add newly labelled crops")
+    parser.add_argument('--epochs', type=int, default=20, help="passes over the sources (default: 20)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="samples per partial_fit call; a resumed run keeps its own (default: 512)")
+    parser.add_argument('--augmentations', type=int, default=DEFAULT_AUGMENTATIONS,
+                        help="augmented copies of each glyph per pass; a resumed run keeps its own (default: 7)")
+    parser.add_argument('--alpha', type=float, default=1e-4, help="L2 regularization strength (default: 1e-4)")
+    parser.add_argument('--seed', type=int, default=0, help="shuffling and augmentation seed")
+    parser.add_argument('--validate', default=dataset.DEFAULT_DATASET_DIR,
+                        help="glyph directory whose clean glyphs are scored after every epoch (default: train20X20)")
+    args = parser.parse_args(argv)
+
+    checkpoint_path = args.checkpoint or os.path.splitext(args.output)[0] + '.ckpt'
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    if args.resume:
+        model, state = load_checkpoint(checkpoint_path)
+        sources = args.sources or state['sources']
+        print(f"Resuming at epoch {state['epoch']}, batch {state['batch']} from {checkpoint_path}")
+    else:
+        sources = args.sources or [dataset.DEFAULT_DATASET_DIR]
+        if args.fine_tune:
+            model, base_state = load_checkpoint(args.fine_tune)
+            classes, glyph_shape = base_state['classes'], base_state['glyph_shape']
+            print(f"Fine-tuning the model from {args.fine_tune}")
+        else:
+            model = new_model(args.alpha)
+            classes = sorted({label for image_path, label in list_samples(sources)})
+            glyph_shape = list(segmentation.GLYPH_SHAPE)
+        state = {'seed': args.seed, 'epoch': 0, 'batch': 0, 'samples_seen': 0, 'classes': list(classes),
+                 'glyph_shape': list(glyph_shape), 'sources': sources, 'batch_size': args.batch_size,
+                 'augmentations': args.augmentations}
+
+    samples = list_samples(sources)
+    validation = list_samples([args.validate]) if args.validate else None
+    print(f"Streaming {len(samples)} glyphs from {len(sources)} source(s), "
+          f"{state['augmentations']} augmented copies each per epoch")
+    train(model, samples, state, args.epochs, checkpoint_path, args.checkpoint_every, validation)
+
+    linear_engine.export_linear_ovr(model, args.output, tuple(state['glyph_shape']))
+    print(f"Saved {args.output} and checkpoint {checkpoint_path}")
+
+
+if __name__ == "__main__":
+    main()
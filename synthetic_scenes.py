@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import sys
+from collections.abc import Sequence
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+GLYPH_DIR = os.path.join(current_dir, 'train20X20')
+MANIFEST_NAME = 'manifest.jsonl'
+
+# Image names of the form synthetic:<index> are rendered on demand instead of read from disk
+SYNTHETIC_PREFIX = 'synthetic:'
+
+# Plates sit within cca.plate_dimensions: 8-20% of the frame height and 15-40% of its width
+DEFAULT_RESOLUTION = (720, 1280)
+DEFAULT_PLATE_WIDTH = (0.2, 0.35)
+DEFAULT_PLATE_ASPECT = (3.0, 4.5)
+DEFAULT_PLATE_LENGTH = (6, 8)
+DEFAULT_ROTATION = 4.0
+DEFAULT_NOISE = 6.0
+DEFAULT_DISTRACTORS = 12
+
+# Plate heights stay inside this fraction of the frame height whatever the aspect ratio
+PLATE_HEIGHT = (0.09, 0.18)
+
+# Dark bumper drawn around the plate, as a fraction of the plate height, so that distractors
+# never merge with it
+BUMPER = 0.15
+
+# Character height as a fraction of the plate height, inside segmentation's 0.35-0.60 band
+CHARACTER_HEIGHT = (0.45, 0.55)
+
+
+class SceneGenerator:
+    """Synthetic gray road scenes holding one plate composed of train20X20 glyphs.
+
+    Every scene is drawn from its own generator seeded with (seed, index), so any
+    scene can be rendered again on its own, in any process, without storing it.
+    The background gets distractors: rectangles and ellipses of random size and
+    brightness, some of them plate-like. The plate sits on a dark bumper.
+    """
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION, plate_width=DEFAULT_PLATE_WIDTH,
+                 plate_aspect=DEFAULT_PLATE_ASPECT, plate_length=DEFAULT_PLATE_LENGTH, rotation=DEFAULT_ROTATION,
+                 noise=DEFAULT_NOISE, distractors=DEFAULT_DISTRACTORS, seed=0, glyph_dir=GLYPH_DIR):
+        self.resolution = tuple(resolution)
+        self.plate_width = plate_width
+        self.plate_aspect = plate_aspect
+        self.plate_length = plate_length
+        self.rotation = rotation
+        self.noise = noise
+        self.distractors = distractors
+        self.seed = seed
+        # Imported here so that batch_recognize can import this module cheaply
+        import dataset
+        image_data, target_data, glyph_shape = dataset.load_dataset(glyph_dir)
+        self.glyphs = image_data.reshape(-1, *glyph_shape)
+        self.classes = np.unique(target_data)
+        # Glyph indices of every class, to draw each character from a random sample of it
+        self.glyphs_by_class = {label: np.flatnonzero(target_data == label) for label in self.classes}
+
+    def options(self):
+        """The options that determine every scene, as recorded in the manifest"""
+        return {'resolution': list(self.resolution), 'plate_width': list(self.plate_width),
+                'plate_aspect': list(self.plate_aspect), 'plate_length': list(self.plate_length),
+                'rotation': self.rotation, 'noise': self.noise, 'distractors': self.distractors, 'seed': self.seed}
+
+    def scene(self, index):
+        """Render scene index; returns (uint8 gray frame, ground truth dict)"""
+        rng = np.random.default_rng([self.seed, index])
+        height, width = self.resolution
+        top_level, bottom_level = rng.uniform(30, 110, size=2)
+        frame = np.repeat(np.linspace(top_level, bottom_level, height)[:, None], width, axis=1)
+        for _ in range(self.distractors):
+            self.draw_distractor(frame, rng)
+
+        text = ''.join(rng.choice(self.classes, size=rng.integers(self.plate_length[0], self.plate_length[1] + 1)))
+        plate, alpha = self.render_plate(text, rng)
+        plate_height, plate_width = plate.shape
+        bumper = int(BUMPER * plate_height)
+        top = int(rng.integers(bumper, height - plate_height - bumper + 1))
+        left = int(rng.integers(bumper, width - plate_width - bumper + 1))
+        frame[top - bumper:top + plate_height + bumper, left - bumper:left + plate_width + bumper] = rng.uniform(10, 40)
+        window = frame[top:top + plate_height, left:left + plate_width]
+        window[...] = window * (1 - alpha) + plate * alpha
+
+        if self.noise:
+            frame += rng.normal(0, self.noise, size=frame.shape)
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+
+        # Box of the plate's visible pixels, like the (minRow, minCol, maxRow, maxCol) the recognizer reports
+        rows = np.flatnonzero(alpha.max(axis=1) > 0.5)
+        cols = np.flatnonzero(alpha.max(axis=0) > 0.5)
+        plate_bbox = (top + int(rows[0]), left + int(cols[0]), top + int(rows[-1]) + 1, left + int(cols[-1]) + 1)
+        return frame, {'index': index, 'text': text, 'plate_bbox': plate_bbox}
+
+    def draw_distractor(self, frame, rng):
+        height, width = frame.shape
+        box_height = int(rng.uniform(0.02, 0.25) * height)
+        box_width = int(rng.uniform(0.02, 0.3) * width)
+        top = int(rng.integers(0, height - box_height + 1))
+        left = int(rng.integers(0, width - box_width + 1))
+        level = rng.uniform(0, 255)
+        window = frame[top:top + box_height, left:left + box_width]
+        if rng.random() < 0.5:
+            window[...] = level
+        else:
+            rows, cols = np.ogrid[-1:1:box_height * 1j, -1:1:box_width * 1j]
+            window[rows ** 2 + cols ** 2 <= 1] = level
+
+    def render_plate(self, text, rng):
+        """Light plate with dark characters, rotated; returns (gray plate, coverage alpha) of equal shape"""
+        from skimage.transform import resize, rotate
+        plate_width = int(rng.uniform(*self.plate_width) * self.resolution[1])
+        plate_height = int(np.clip(plate_width / rng.uniform(*self.plate_aspect),
+                                   PLATE_HEIGHT[0] * self.resolution[0], PLATE_HEIGHT[1] * self.resolution[0]))
+        plate_level, ink_level = rng.uniform(190, 245), rng.uniform(10, 60)
+        plate = np.full((plate_height, plate_width), plate_level)
+
+        char_height = int(rng.uniform(*CHARACTER_HEIGHT) * plate_height)
+        margin = int(0.05 * plate_width)
+        # Keep characters inside segmentation's 5-15% of the plate width and at least 2 px apart
+        char_width = int(np.clip(0.6 * char_height, 0.07 * plate_width, 0.12 * plate_width))
+        char_width = min(char_width, (plate_width - 2 * margin - 2 * (len(text) - 1)) // len(text))
+        gap = (plate_width - 2 * margin - len(text) * char_width) / max(1, len(text) - 1)
+        char_top = (plate_height - char_height) // 2
+        for position, character in enumerate(text):
+            glyph = self.glyphs[rng.choice(self.glyphs_by_class[character])]
+            coverage = resize(glyph.astype(float), (char_height, char_width), order=1)
+            left = margin + int(round(position * (char_width + gap)))
+            window = plate[char_top:char_top + char_height, left:left + char_width]
+            window[...] = window * (1 - coverage) + ink_level * coverage
+
+        angle = rng.uniform(-self.rotation, self.rotation) if self.rotation else 0.0
+        if not angle:
+            return plate, np.ones_like(plate)
+        alpha = rotate(np.ones_like(plate), angle, resize=True, order=1)
+        return rotate(plate, angle, resize=True, order=1), alpha
+
+    def scenes(self, count=None, start=0):
+        """Lazily yield (frame, truth) for count scenes from start on, or forever when count is None"""
+        index = start
+        while count is None or index < start + count:
+            yield self.scene(index)
+            index += 1
+
+
+class SyntheticImageNames(Sequence):
+    """The synthetic:<index> names of count scenes, made on access so millions cost no memory"""
+
+    def __init__(self, count, start=0):
+        self.indices = range(start, start + count)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [f"{SYNTHETIC_PREFIX}{index}" for index in self.indices[position]]
+        return f"{SYNTHETIC_PREFIX}{self.indices[position]}"
+
+
+def synthetic_index(image_name):
+    """Scene index of a synthetic:<index> image name, or None for any other path"""
+    if isinstance(image_name, str) and image_name.startswith(SYNTHETIC_PREFIX):
+        return int(image_name[len(SYNTHETIC_PREFIX):])
+    return None
+
+
+def write_scenes(generator, output_dir, count, start=0, image_format='jpg'):
+    """Write count scenes and a JSON-lines manifest of their ground truth; returns the manifest path.
+
+    Scenes are rendered and written one at a time. The manifest's first line holds
+    the generator options; every other line has the image path relative to
+    output_dir, its plate text and plate box.
+    """
+    from PIL import Image
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path, 'w') as manifest:
+        manifest.write(json.dumps({'generator': generator.options()}) + '\n')
+        for frame, truth in generator.scenes(count, start):
+            image_name = f"scene_{truth['index']:08d}.{image_format}"
+            Image.fromarray(frame).save(os.path.join(output_dir, image_name), quality=95)
+            manifest.write(json.dumps({'image': image_name, **truth}) + '\n')
+    return manifest_path
+
+
+def read_ground_truth(manifest_path):
+    """{absolute image path: plate text} from a manifest written by write_scenes"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    truth = {}
+    with open(manifest_path) as manifest:
+        for line in manifest:
+            record = json.loads(line)
+            if 'image' in record:
+                truth[os.path.join(base_dir, record['image'])] = record['text']
+    return truth
+
+
+def parse_resolution(value):
+    """'720x1280' -> (720, 1280), as rows x columns"""
+    rows, cols = value.lower().split('x')
+    return int(rows), int(cols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic plate scenes with a ground-truth manifest")
+    parser.add_argument('output_dir', help="directory for the images and manifest.jsonl")
+    parser.add_argument('-n', '--count', type=int, default=100, help="scenes to generate (default: 100)")
+    parser.add_argument('--start', type=int, default=0, help="index of the first scene (default: 0)")
+    parser.add_argument('--resolution', type=parse_resolution, default=DEFAULT_RESOLUTION,
+                        help="frame size as ROWSxCOLS (default: 720x1280)")
+    parser.add_argument('--plate-width', type=float, nargs=2, default=DEFAULT_PLATE_WIDTH,
+                        help="plate width range as fractions of the frame width (default: 0.2 0.35)")
+    parser.add_argument('--rotation', type=float, default=DEFAULT_ROTATION,
+                        help="largest plate rotation in degrees (default: 4)")
+    parser.add_argument('--noise', type=float, default=DEFAULT_NOISE,
+                        help="standard deviation of gaussian pixel noise (default: 6)")
+    parser.add_argument('--distractors', type=int, default=DEFAULT_DISTRACTORS,
+                        help="random shapes drawn on the background (default: 12)")
+    parser.add_argument('--seed', type=int, default=0, help="scene seed (default: 0)")
+    parser.add_argument('--format', default='jpg', choices=['jpg', 'png'], help="image format (default: jpg)")
+    args = parser.parse_args(argv)
+
+    generator = SceneGenerator(args.resolution, tuple(args.plate_width), rotation=args.rotation, noise=args.noise,
+                               distractors=args.distractors, seed=args.seed)
+    manifest_path = write_scenes(generator, args.output_dir, args.count, args.start, args.format)
+    print(f"Wrote {args.count} scenes and {manifest_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+import prediction
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+
+# Text and plate box each sample reads with at full resolution
+SAMPLES = {
+    'car6.jpg': ('LEM446AA', (451, 259, 508, 385)),
+    'car10.jpg': ('EGB62AA', (415, 173, 466, 307)),
+}
+
+
+@pytest.mark.parametrize('max_working_size', [500, 400, 300, 200])
+@pytest.mark.parametrize('image_name', sorted(SAMPLES))
+def test_multiscale_search_reads_plate_below_native_size(image_name, max_working_size):
+    # Both samples are larger than every working size, so plates are first searched on a downscaled level
+    text, (top, left, bottom, right) = SAMPLES[image_name]
+    recognizer = prediction.PlateRecognizer(max_working_size=max_working_size)
+    result = recognizer.recognize(os.path.join(current_dir, image_name))
+
+    assert result.text == text
+    # The mapped box must contain the plate box found at full resolution
+    assert (result.plate_bbox[0] <= top and result.plate_bbox[1] <= left
+            and result.plate_bbox[2] >= bottom and result.plate_bbox[3] >= right)
@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+import pytest
+from skimage.io import imread
+
+import prediction
+import stream
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.mark.parametrize('low_memory', [False, True])
+def test_moving_plate_is_never_read_cut_off_by_the_search_region(low_memory):
+    # The plate moves 75 px right per frame, so it leaves the region searched around its last box
+    frame = imread(os.path.join(current_dir, 'car6.jpg'))
+    frames = [(frame_index, np.roll(frame, 75 * frame_index, axis=1)) for frame_index in range(5)]
+    recognizer = stream.StreamRecognizer(prediction.PlateRecognizer(low_memory=low_memory))
+
+    readings = []
+    for frame_index, moved in frames:
+        result, finished = recognizer.process_frame(frame_index, moved)
+        readings.append((result.text, result.plate_bbox))
+    vehicles = recognizer.finish()
+
+    assert readings == [('LEM446AA', (451, 259 + 75 * frame_index, 508, 385 + 75 * frame_index))
+                        for frame_index in range(5)]
+    assert [(vehicle.text, vehicle.readings, vehicle.agreement) for vehicle in vehicles] == [('LEM446AA', 5, 1.0)]
@@ -0,0 +1,13 @@
+import train_search
+
+
+def test_clearly_worse_trial_is_pruned_after_first_fold():
+    good = {'dataset': 'train20X20', 'type': 'svc', 'kernel': 'linear', 'C': 1.0}
+    # So little regularization weight that the SVC barely separates any class
+    worse = {'dataset': 'train20X20', 'type': 'svc', 'kernel': 'linear', 'C': 1e-6}
+    report = train_search.run_search([good, worse], num_of_fold=4, workers=1, progress=False)
+
+    by_name = {trial['name']: trial for trial in report}
+    assert by_name[train_search.trial_name(good)]['status'] == 'done'
+    assert by_name[train_search.trial_name(worse)]['status'] == 'pruned'
+    assert by_name[train_search.trial_name(worse)]['folds_evaluated'] == 1
@@ -0,0 +1,247 @@
+import argparse
+import collections
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import joblib
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+from sklearn.svm import SVC
+
+import dataset
+import linear_engine
+from hamming_engine import HammingClassifier
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(current_dir, 'models', 'search')
+
+# Each entry expands to the cartesian product of its list-valued parameters
+DEFAULT_SEARCH_SPACE = {
+    'datasets': ['train20X20', 'train10X20'],
+    'classifiers': [
+        {'type': 'svc', 'kernel': 'linear', 'C': [0.1, 1.0, 10.0]},
+        {'type': 'svc', 'kernel': 'rbf', 'C': [1.0, 10.0], 'gamma': ['scale']},
+        {'type': 'hamming', 'k': [1, 3, 5]},
+    ],
+}
+
+# Characters timed one at a time to measure single-character latency
+LATENCY_SAMPLES = 50
+
+# Per-worker caches, filled on first use so every trial after the first reuses them
+_features = {}
+_folds = {}
+
+
+def expand_search_space(search_space):
+    """Turn a declared search space into a list of trial configurations"""
+    trials = []
+    for dataset_name in search_space['datasets']:
+        for classifier in search_space['classifiers']:
+            keys = sorted(classifier)
+            values = [classifier[key] if isinstance(classifier[key], list) else [classifier[key]] for key in keys]
+            for combination in itertools.product(*values):
+                trials.append({'dataset': dataset_name, **dict(zip(keys, combination))})
+    return trials
+
+
+def trial_name(config):
+    params = ','.join(f"{key}={config[key]}" for key in sorted(config) if key not in ('dataset', 'type'))
+    return f"{config['dataset']}/{config['type']}({params})"
+
+
+def resolve_dataset(dataset_name):
+    return dataset_name if os.path.isabs(dataset_name) else os.path.join(current_dir, dataset_name)
+
+
+def load_features(dataset_name):
+    if dataset_name not in _features:
+        _features[dataset_name] = dataset.load_dataset(resolve_dataset(dataset_name))
+    return _features[dataset_name]
+
+
+def fold_splits(dataset_name, num_of_fold, seed):
+    key = (dataset_name, num_of_fold, seed)
+    if key not in _folds:
+        image_data, target_data, glyph_shape = load_features(dataset_name)
+        splitter = StratifiedKFold(num_of_fold, shuffle=True, random_state=seed)
+        _folds[key] = list(splitter.split(image_data, target_data))
+    return _folds[key]
+
+
+def fit_model(config, train_data, train_label, glyph_shape, probability=False):
+    """Fit the classifier a trial describes, as the engine the recognizer would run"""
+    if config['type'] == 'hamming':
+        return HammingClassifier(config['k'], glyph_shape).fit(train_data, train_label)
+    svc_model = SVC(kernel=config['kernel'], C=config['C'], gamma=config.get('gamma', 'scale'),
+                    probability=probability).fit(train_data, train_label)
+    svc_model.glyph_shape = glyph_shape
+    if config['kernel'] == 'linear' and not probability:
+        return linear_engine.LinearEngine(svc_model.classes_.astype(str), svc_model.coef_,
+                                          svc_model.intercept_, glyph_shape=glyph_shape)
+    return svc_model
+
+
+def run_fold(config, fold_index, num_of_fold, seed):
+    """Train on all other folds and score one; returns (correct, tested, seconds per batched char)"""
+    image_data, target_data, glyph_shape = load_features(config['dataset'])
+    train_index, test_index = fold_splits(config['dataset'], num_of_fold, seed)[fold_index]
+    model = fit_model(config, image_data[train_index], target_data[train_index], glyph_shape)
+    start = time.perf_counter()
+    predicted = model.predict(image_data[test_index])
+    seconds = time.perf_counter() - start
+    correct = int(np.count_nonzero(predicted == target_data[test_index]))
+    return correct, len(test_index), seconds / len(test_index)
+
+
+def measure_latency(config):
+    """Median seconds to classify a single character with a model fitted on the whole dataset"""
+    image_data, target_data, glyph_shape = load_features(config['dataset'])
+    model = fit_model(config, image_data, target_data, glyph_shape)
+    durations = []
+    for sample in image_data[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        model.predict(sample.reshape(1, -1))
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations))
+
+
+def run_search(trials, num_of_fold=4, seed=0, workers=None, prune_margin=0.02, progress=True):
+    """Cross-validate every trial fold by fold across a process pool.
+
+    Folds of one trial run in order while different trials run in parallel, at most
+    one trial per worker at a time so that early trials finish and set the bar for
+    later ones. A trial is pruned once its mean accuracy over the folds scored so far
+    falls more than prune_margin below the best mean any trial reached over as many
+    folds, or once even a perfect score on its remaining folds could not bring it
+    within prune_margin of the best fully-evaluated trial.
+    """
+    state = [{'config': config, 'name': trial_name(config), 'correct': 0, 'tested': 0, 'fold_accuracy': [],
+              'seconds_per_char': [], 'folds_done': 0, 'status': 'running'} for config in trials]
+    waiting = collections.deque(state)
+    best_accuracy = 0.0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+
+        def start_next_trial():
+            if waiting:
+                trial = waiting.popleft()
+                running[executor.submit(run_fold, trial['config'], 0, num_of_fold, seed)] = trial
+
+        for _ in range(workers or os.cpu_count() or 1):
+            start_next_trial()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                trial = running.pop(future)
+                correct, tested, seconds_per_char = future.result()
+                trial['correct'] += correct
+                trial['tested'] += tested
+                trial['fold_accuracy'].append(correct / tested)
+                trial['seconds_per_char'].append(seconds_per_char)
+                trial['folds_done'] += 1
+                total = len(load_features(trial['config']['dataset'])[1])
+                folds_done = trial['folds_done']
+                best_partial = max(np.mean(other['fold_accuracy'][:folds_done]) for other in state
+                                   if len(other['fold_accuracy']) >= folds_done)
+
+                if folds_done == num_of_fold:
+                    trial['status'] = 'done'
+                    best_accuracy = max(best_accuracy, trial['correct'] / total)
+                elif (np.mean(trial['fold_accuracy']) < best_partial - prune_margin
+                      or (trial['correct'] + total - trial['tested']) / total < best_accuracy - prune_margin):
+                    trial['status'] = 'pruned'
+                else:
+                    future = executor.submit(run_fold, trial['config'], folds_done, num_of_fold, seed)
+                    running[future] = trial
+                    continue
+                start_next_trial()
+                if progress:
+                    print(f"{trial['status']:>6}  {trial['name']:<48} "
+                          f"{trial['correct'] / trial['tested'] * 100:6.2f}% after {trial['folds_done']} folds")
+
+        completed = [trial for trial in state if trial['status'] == 'done']
+        latencies = executor.map(measure_latency, [trial['config'] for trial in completed])
+        for trial, latency in zip(completed, latencies):
+            trial['single_char_latency_ms'] = latency * 1000
+
+    report = []
+    for trial in state:
+        report.append({
+            'name': trial['name'],
+            'config': trial['config'],
+            'status': trial['status'],
+            'folds_evaluated': trial['folds_done'],
+            'accuracy': trial['correct'] / trial['tested'],
+            'batched_char_latency_us': float(np.mean(trial['seconds_per_char'])) * 1e6,
+            'single_char_latency_ms': trial.get('single_char_latency_ms'),
+        })
+    return report
+
+
+def best_trial(report):
+    """Most accurate completed trial; faster batched inference breaks ties"""
+    completed = [trial for trial in report if trial['status'] == 'done']
+    return max(completed, key=lambda trial: (round(trial['accuracy'], 6), -trial['batched_char_latency_us']))
+
+
+def save_best(trial, output_dir):
+    """Refit the winning configuration on its whole dataset and write it under output_dir"""
+    config = trial['config']
+    image_data, target_data, glyph_shape = load_features(config['dataset'])
+    os.makedirs(output_dir, exist_ok=True)
+    if config['type'] == 'hamming':
+        model_path = os.path.join(output_dir, 'best.npz')
+        fit_model(config, image_data, target_data, glyph_shape).save(model_path)
+    else:
+        svc_model = fit_model(config, image_data, target_data, glyph_shape, probability=True)
+        if config['kernel'] == 'linear':
+            model_path = os.path.join(output_dir, 'best.npz')
+            linear_engine.export_linear_svc(svc_model, model_path, glyph_shape)
+        else:
+            model_path = os.path.join(output_dir, 'best.pkl')
+            joblib.dump(svc_model, model_path)
+    return model_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search classifier hyperparameters with parallel cross-validation")
+    parser.add_argument('--space', help="JSON file with a search space (default: DEFAULT_SEARCH_SPACE)")
+    parser.add_argument('--folds', type=int, default=4, help="cross-validation folds (default: 4)")
+    parser.add_argument('--seed', type=int, default=0, help="fold shuffling seed")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--prune-margin', type=float, default=0.02,
+                        help="prune trials that can no longer get within this accuracy of the best (default: 0.02)")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help="where to write the best model and the search report")
+    args = parser.parse_args(argv)
+
+    search_space = DEFAULT_SEARCH_SPACE
+    if args.space:
+        with open(args.space) as space_file:
+            search_space = json.load(space_file)
+
+    trials = expand_search_space(search_space)
+    print(f"Searching {len(trials)} configurations with {args.folds}-fold cross-validation")
+    report = run_search(trials, args.folds, args.seed, args.workers, args.prune_margin)
+
+    print(f"\n{'configuration':<50}{'status':>8}{'accuracy':>10}{'batch us/char':>15}{'single ms':>11}")
+    for trial in sorted(report, key=lambda trial: -trial['accuracy']):
+        single = trial['single_char_latency_ms']
+        print(f"{trial['name']:<50}{trial['status']:>8}{trial['accuracy'] * 100:>9.2f}%"
+              f"{trial['batched_char_latency_us']:>15.1f}{single if single is not None else float('nan'):>11.3f}")
+
+    best = best_trial(report)
+    model_path = save_best(best, args.output_dir)
+    with open(os.path.join(args.output_dir, 'report.json'), 'w') as report_file:
+        json.dump({'best': best, 'model_path': os.path.relpath(model_path, current_dir), 'trials': report},
+                  report_file, indent=2)
+    print(f"\nBest: {best['name']} ({best['accuracy'] * 100:.2f}%), saved to {model_path}")
+
+
+if __name__ == "__main__":
+    main()